@@ -0,0 +1,97 @@
+from bisect import bisect_right
+
+import numpy as np
+
+
+class YearStatsIndex:
+    """Cumulative per-year aggregates behind /api/stats/<end_year>.
+
+    One snapshot is kept per distinct production year, holding running movie
+    counts, rating sums and country x genre tallies of every film released in
+    or before that year. A request is answered by a bisect over the years plus
+    a finalize step that picks each country's top genre.
+    """
+
+    def __init__(self, store):
+        self.years = []
+        self._snapshots = []
+        self._finalized = {}
+
+        year = store.column('year')
+        rating = store.column('rating')
+        rating_mask = store.mask('rating')
+        positions = np.flatnonzero(store.mask('year'))
+        order = positions[np.argsort(year[positions], kind='stable')]
+
+        total = 0
+        rating_count = 0
+        rating_sum = 0.0
+        genres = {}
+        countries = {}
+        country_genres = {}
+        # first (movie position, genre position) a genre was seen at for a country,
+        # so ties for top_genre break the same way as a scan in dataset order
+        first_seen = {}
+
+        for n, i in enumerate(order):
+            total += 1
+            if rating_mask[i]:
+                rating_count += 1
+                rating_sum += rating[i]
+
+            movie_genres = store.genres[i]
+            for genre in movie_genres:
+                genres[genre] = genres.get(genre, 0) + 1
+
+            for country in store.countries[i]:
+                countries[country] = countries.get(country, 0) + 1
+                counts = country_genres.setdefault(country, {})
+                seen = first_seen.setdefault(country, {})
+                for j, genre in enumerate(movie_genres):
+                    counts[genre] = counts.get(genre, 0) + 1
+                    seen[genre] = min(seen.get(genre, (i, j)), (i, j))
+
+            if n + 1 == len(order) or year[order[n + 1]] != year[i]:
+                self.years.append(int(year[i]))
+                self._snapshots.append({
+                    'total': total,
+                    'rating_count': rating_count,
+                    'rating_sum': rating_sum,
+                    'genres': dict(genres),
+                    'countries': dict(countries),
+                    'country_genres': {c: dict(g) for c, g in country_genres.items()},
+                    'first_seen': {c: dict(g) for c, g in first_seen.items()},
+                })
+
+    def resolve(self, end_year):
+        """Returns the index of the latest snapshot at or before end_year, None if there is none"""
+        position = bisect_right(self.years, end_year) - 1
+        if position < 0:
+            return None
+        return position
+
+    def stats_until(self, end_year):
+        """Returns statistics for films produced up to end_year, clamped to the indexed years"""
+        position = self.resolve(end_year)
+        if position is None:
+            return None
+        if position not in self._finalized:
+            self._finalized[position] = self._finalize(self._snapshots[position])
+        return self._finalized[position]
+
+    @staticmethod
+    def _finalize(snapshot):
+        countries = {}
+        for country, counts in snapshot['country_genres'].items():
+            seen = snapshot['first_seen'][country]
+            top_genre = None
+            if counts:
+                top_genre = max(counts, key=lambda g: (counts[g], tuple(-p for p in seen[g])))
+            countries[country] = {"count": snapshot['countries'][country], "top_genre": top_genre}
+
+        return {
+            "total_movies": snapshot['total'],
+            "countries": countries,
+            "genres": dict(snapshot['genres']),
+            "average_rating": snapshot['rating_sum'] / snapshot['rating_count'] if snapshot['rating_count'] else 0,
+        }
@@ -0,0 +1,105 @@
+import numpy as np
+
+from histogram import parse_float
+from projection import QueryError
+
+
+# derived columns available to analytics next to the store's numeric columns
+DERIVED_COLUMNS = {
+    'profit': lambda store: np.nan_to_num(store.column('gross_world')) - np.nan_to_num(store.column('budget')),
+}
+
+# the fields of the dashboard's correlation matrix (frontend/src/utils/extractNumericData.js)
+CORRELATION_FIELDS = ('budget', 'gross_usa', 'gross_world', 'gross_russia', 'rating', 'audience', 'runtime', 'profit')
+
+CORRELATION_METHODS = ('pearson', 'spearman')
+MISSING_MODES = ('zero', 'drop')
+
+
+def numeric_column(store, name):
+    if name in DERIVED_COLUMNS:
+        return DERIVED_COLUMNS[name](store)
+    return store.column(name)
+
+
+def available_fields(store):
+    return list(store.columns) + list(DERIVED_COLUMNS)
+
+
+def parse_fields(value, store, default):
+    if not value:
+        return list(default)
+    fields = [f.strip() for f in value.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in available_fields(store)]
+    if unknown:
+        raise QueryError(f"Unknown fields: {', '.join(unknown)}")
+    if len(set(fields)) != len(fields):
+        raise QueryError("fields must not repeat")
+    return fields
+
+
+def movie_filter(args, snapshot):
+    """Boolean mask of the movies selected by ?year_from=, ?year_to= and ?genre= (comma separated, any of)"""
+    store = snapshot.store
+    mask = np.ones(store.size, dtype=bool)
+
+    year = store.column('year')
+    year_from = parse_float(args, 'year_from')
+    year_to = parse_float(args, 'year_to')
+    if year_from is not None:
+        mask &= year >= year_from
+    if year_to is not None:
+        mask &= year <= year_to
+
+    genres = [g for g in args.get('genre', '').split(',') if g.strip()]
+    if genres:
+        selected = np.zeros(store.size, dtype=bool)
+        for genre in genres:
+            selected[snapshot.lookup.genres.exact(genre)] = True
+        mask &= selected
+
+    return mask
+
+
+def filter_key(args):
+    return tuple(args.get(name, '') for name in ('year_from', 'year_to', 'genre'))
+
+
+def rank(column):
+    """Ranks values, ties get the average of their ranks"""
+    order = np.argsort(column, kind='mergesort')
+    ranks = np.empty(len(column), dtype=np.float64)
+    ranks[order] = np.arange(1, len(column) + 1)
+    _, inverse, counts = np.unique(column, return_inverse=True, return_counts=True)
+    sums = np.bincount(inverse, weights=ranks)
+    return sums[inverse] / counts[inverse]
+
+
+def correlation_matrix(store, fields, mask, method='pearson', missing='zero'):
+    """Computes the k x k correlation matrix of the selected movies in one pass.
+
+    missing='zero' counts missing values as 0 like the dashboard did,
+    missing='drop' keeps only movies that have every field.
+    """
+    matrix = np.column_stack([numeric_column(store, f) for f in fields])[mask]
+    if missing == 'zero':
+        matrix = np.nan_to_num(matrix)
+    else:
+        matrix = matrix[~np.isnan(matrix).any(axis=1)]
+
+    if method == 'spearman' and len(matrix):
+        matrix = np.column_stack([rank(matrix[:, i]) for i in range(matrix.shape[1])])
+
+    if len(matrix) < 2:
+        result = np.full((len(fields), len(fields)), np.nan)
+    else:
+        with np.errstate(invalid='ignore', divide='ignore'):
+            result = np.corrcoef(matrix, rowvar=False).reshape(len(fields), len(fields))
+
+    return {
+        'keys': list(fields),
+        'matrix': [[None if np.isnan(v) else round(float(v), 6) for v in row] for row in result],
+        'method': method,
+        'missing': missing,
+        'count': int(len(matrix)),
+    }
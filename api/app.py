@@ -1,261 +1,395 @@
-from flask import Flask, jsonify, make_response
+from flask import Flask, g, make_response, request
 from flask_restful import Resource, Api
 from flask_cors import CORS
 import json
 import os
-from collections import Counter
+
+from analytics import (
+    CORRELATION_FIELDS, CORRELATION_METHODS, MISSING_MODES,
+    correlation_matrix, filter_key, movie_filter, parse_fields
+)
+from charts import (
+    BOXOFFICE_BINS, DEFAULT_ROLES, DURATION_BINS, RATING_BINS,
+    boxoffice_distribution, duration_distribution, rating_distribution, trusted_people
+)
+from dataset import Dataset
+import metrics
+from histogram import HistogramSpec
+from indexes import LookupIndex
+from people import ROLES, SORT_KEYS
+from projection import Page, Projection, QueryError, parse_int
+from search import SearchQuery
+from sentiment import GROUPINGS
+import wire
 
 app = Flask(__name__)
 api = Api(app)
 app.config['JSON_AS_ASCII'] = False 
 CORS(app)
+metrics.init_app(app)
 
 @api.representation('application/json')
 def output_json(data, code, headers=None):
     resp = make_response(
-        json.dumps(data, ensure_ascii=False, indent=2), 
+        json.dumps(data, ensure_ascii=False, separators=(',', ':')),
         code
     )
     resp.headers.extend(headers or {})
     resp.headers['Content-Type'] = 'application/json; charset=utf-8'
     return resp
 
-JSON_PATH = os.path.join(os.path.dirname(__file__), 'data/optimized_data.json')
+JSON_PATH = os.environ.get('DATA_PATH', os.path.join(os.path.dirname(__file__), 'data/optimized_data.json'))
+# seconds between checks of the dataset file for a new version, 0 disables reloading
+RELOAD_INTERVAL = float(os.environ.get('DATA_RELOAD_INTERVAL', 5))
+
+dataset = Dataset(JSON_PATH, poll_interval=RELOAD_INTERVAL)
+
 
-with open(JSON_PATH, 'r', encoding='utf-8') as f:
-    movies_data = json.load(f)
+@app.before_request
+def pin_snapshot():
+    """Pins the request to the dataset version current when it started"""
+    g.snapshot = dataset.current
+
+@app.after_request
+def add_version_header(resp):
+    snapshot = g.get('snapshot')
+    if snapshot is not None:
+        resp.headers['X-Data-Version'] = snapshot.version
+    return resp
+
+
+def respond(key, build, columnar=None):
+    """Serves a cached payload as JSON or, when negotiated, MessagePack"""
+    try:
+        mimetype = wire.negotiate()
+    except wire.UnsupportedFormat as e:
+        return {"error": str(e)}, 406
+    cache = g.snapshot.cache
+    # payloads without query or path parameters are the shared defaults
+    static = not (request.args or request.view_args)
+    if mimetype == wire.MSGPACK:
+        return cache.respond((key, mimetype), columnar or build, encode=wire.pack, mimetype=mimetype, static=static)
+    return cache.respond((key, mimetype), build, static=static)
+
+
+def match_mode():
+    """Reads the ?match= query parameter of the country/genre lookups"""
+    return request.args.get('match', 'exact')
+
+def movies_at(positions):
+    """Serves the movies at the given positions, projected by ?fields=/?exclude=, streamed on request"""
+    movies = g.snapshot.movies
+    try:
+        projection = Projection.from_args(request.args)
+    except QueryError as e:
+        return {"error": str(e)}, 400
+    if wire.wants_stream():
+        return wire.stream_movies(movies, positions, projection)
+    return respond(('movies_at', positions, projection.key), lambda: [projection.apply(movies[i]) for i in positions])
+
+def movie_listing(store, projection, page):
+    """Returns the (projected) movies of one page, wrapped with pagination info when paginated"""
+    start, stop = page.bounds(store.size)
+    movies = store.movies[start:stop]
+    if projection:
+        movies = [projection.apply(m) for m in movies]
+    if not page.paginated:
+        return movies
+    return page.envelope(movies, store.size, store.version)
+
+def movie_columns(store, projection, page):
+    """Columnar MessagePack body for one page of movies"""
+    start, stop = page.bounds(store.size)
+    records = [projection.apply(m) for m in store.movies[start:stop]]
+    body = wire.columnar_movies(store, start, stop, records, projection)
+    body['total'] = store.size
+    body['next_cursor'] = page.next_cursor(store.size, store.version)
+    return body
 
 class Movies(Resource):
     def get(self):
-        return jsonify(movies_data)
+        """Returns movies, ?fields=/?exclude= project them, limit/offset/cursor paginate them"""
+        store = g.snapshot.store
+        try:
+            projection = Projection.from_args(request.args)
+            page = Page.from_args(request.args, store.version)
+        except QueryError as e:
+            return {"error": str(e)}, 400
+        if wire.wants_stream():
+            return wire.stream_movies(store.movies, range(*page.bounds(store.size)), projection)
+        return respond(
+            ('movies', projection.key, page.key),
+            lambda: movie_listing(store, projection, page),
+            columnar=lambda: movie_columns(store, projection, page)
+        )
+
+def search_results(snapshot, query, projection, page):
+    """One page of the movies matching a search, wrapped with pagination info"""
+    positions = snapshot.search.search(query)
+    start, stop = page.bounds(len(positions))
+    movies = [projection.apply(snapshot.movies[i]) for i in positions[start:stop]]
+    return page.envelope(movies, len(positions), snapshot.version)
+
+class MovieSearch(Resource):
+    def get(self):
+        """Returns the movies matching every given predicate (see search.py), sorted by ?sort= and paginated"""
+        snapshot = g.snapshot
+        try:
+            query = SearchQuery.from_args(request.args, snapshot.store)
+            projection = Projection.from_args(request.args)
+            page = Page.from_args(request.args, snapshot.version)
+        except QueryError as e:
+            return {"error": str(e)}, 400
+        if wire.wants_stream():
+            positions = snapshot.search.search(query)
+            return wire.stream_movies(snapshot.movies, positions[slice(*page.bounds(len(positions)))], projection)
+        return respond(
+            ('search', query.key, projection.key, page.key),
+            lambda: search_results(snapshot, query, projection, page)
+        )
 
 class Movie(Resource):
     def get(self, movie_id):
         """Returns the film by its position in the top 250 (1-250)"""
-        try:
-            movie = next(m for m in movies_data if int(m['details']['Топ 250']) == movie_id)
-            return jsonify(movie)
-        except StopIteration:
+        movie = g.snapshot.lookup.movie_by_rank(movie_id)
+        if movie is None:
             return {"error": "Movie not found"}, 404
+        return respond(('movie', movie_id), lambda: movie)
 
 class MoviesByCountry(Resource):
     def get(self, country):
-        """Returns movies by country of production"""
-        filtered = [m for m in movies_data if country.lower() in m['details']['Страна'].lower()]
-        return jsonify(filtered)
+        """Returns movies by country of production, ?match=prefix matches the start of the name"""
+        match = match_mode()
+        if match not in LookupIndex.MATCH_MODES:
+            return {"error": f"Unknown match mode: {match}"}, 400
+        return movies_at(tuple(g.snapshot.lookup.countries.lookup(country, match)))
 
 class MoviesByGenre(Resource):
     def get(self, genre):
-        """Returns movies by genre"""
-        filtered = [m for m in movies_data if genre.lower() in m['details']['Жанр'].lower()]
-        return jsonify(filtered)
+        """Returns movies by genre, ?match=prefix matches the start of the genre"""
+        match = match_mode()
+        if match not in LookupIndex.MATCH_MODES:
+            return {"error": f"Unknown match mode: {match}"}, 400
+        return movies_at(tuple(g.snapshot.lookup.genres.lookup(genre, match)))
 
 class Stats(Resource):
     def get(self):
         """Returns movie statistics"""
-        stats = {
-            "total_movies": len(movies_data),
-            "countries": {},
-            "genres": {},
-            "average_rating": sum(float(m['details']['Рейтинг']) for m in movies_data) / len(movies_data)
-        }
-        
-        for movie in movies_data:
-            country = movie['details']['Страна']
-            stats['countries'][country] = stats['countries'].get(country, 0) + 1
-        
-        for movie in movies_data:
-            for genre in movie['details']['Жанр'].split(', '):
-                stats['genres'][genre] = stats['genres'].get(genre, 0) + 1
-        
-        return jsonify(stats)
+        return respond('stats', lambda: g.snapshot.aggregate('stats'))
 
 class StatsByYear(Resource):
     def get(self, end_year):
         """Returns movie statistics for films by the given year"""
-        try:
-            filtered_movies = [
-                m for m in movies_data 
-                if int(m['details']['Год производства']) <= end_year
-            ]
-            
-            if not filtered_movies:
-                return {"error": f"No movies found before {end_year}"}, 404
-                
-            stats = {
-                "total_movies": len(filtered_movies),
-                "countries": {},
-                "genres": {},
-                "average_rating": sum(float(m['details']['Рейтинг']) for m in filtered_movies) / len(filtered_movies)
-            }
-
-            country_genre_count = {}
-
-            for movie in filtered_movies:
-                countries = [c.strip() for c in movie['details']['Страна'].split(",")]
-                genres = [g.strip() for g in movie['details']['Жанр'].split(",")]
-
-                for country in countries:
-                    if not country:
-                        continue
-
-                    stats['countries'].setdefault(country, {"count": 0, "top_genre": None})
-                    stats['countries'][country]["count"] += 1
-
-                    country_genre_count.setdefault(country, {})
-                    for genre in genres:
-                        if genre:
-                            country_genre_count[country][genre] = country_genre_count[country].get(genre, 0) + 1
+        year_stats = g.snapshot.year_stats
+        position = year_stats.resolve(end_year)
 
-                for genre in genres:
-                    if genre:
-                        stats['genres'][genre] = stats['genres'].get(genre, 0) + 1
+        if position is None:
+            return {"error": f"No movies found before {end_year}"}, 404
 
-            for country, genre_counts in country_genre_count.items():
-                top_genre = max(genre_counts.items(), key=lambda x: x[1])[0]
-                stats['countries'][country]["top_genre"] = top_genre
-
-            return jsonify(stats)
-
-        except Exception as e:
-            return {"error": f"Server error: {str(e)}"}, 500
+        year = year_stats.years[position]
+        return respond(('stats', year), lambda: g.snapshot.aggregate(f'stats/{year}'))
 
 
 @app.route('/api/charts/years')
 def years_data():
-    years = [movie['details']['Год производства'] for movie in movies_data]
-    year_counts = Counter(years)
-    return jsonify(dict(sorted(year_counts.items())))
+    return respond('charts/years', lambda: g.snapshot.aggregate('charts/years'))
+
+def histogram_spec(default):
+    """Reads the binning query parameters of a chart endpoint"""
+    return HistogramSpec.from_args(request.args, default)
+
+def distribution(name, default, compute):
+    """Serves a histogram chart, precomputed for the default binning"""
+    try:
+        spec = histogram_spec(default)
+    except QueryError as e:
+        return {"error": str(e)}, 400
+    snapshot = g.snapshot
+    if spec.key == default.key:
+        return respond((name, spec.key), lambda: snapshot.aggregate(name))
+    return respond((name, spec.key), lambda: compute(snapshot.store, spec))
 
 @app.route('/api/charts/boxoffice')
 def boxoffice_data():
-    box_offices = []
-    for movie in movies_data:
-        try:
-            worldwide = float(movie['details']['Сборы в мире $'])
-            box_offices.append(worldwide)
-        except (KeyError, ValueError):
-            continue
-    
-    if box_offices:
-        min_val = min(box_offices)
-        max_val = max(box_offices)
-        step = (max_val - min_val) / 30
-        bins = [min_val + i*step for i in range(31)]
-        
-        distribution = {f"{bins[i]:.0f}-{bins[i+1]:.0f}": 0 for i in range(30)}
-        for amount in box_offices:
-            for i in range(30):
-                if bins[i] <= amount < bins[i+1]:
-                    distribution[f"{bins[i]:.0f}-{bins[i+1]:.0f}"] += 1
-                    break
-        return jsonify(distribution)
-    return jsonify({})
+    return distribution('charts/boxoffice', BOXOFFICE_BINS, boxoffice_distribution)
 
 @app.route('/api/charts/ratings')
 def ratings_data():
-    ratings = []
-    for movie in movies_data:
-        try:
-            rating = float(movie['details']['Рейтинг'])
-            ratings.append(rating)
-        except (KeyError, ValueError):
-            continue
-    
-    if ratings:
-        rating_dist = {}
-        for r in range(70, 101):
-            raiting = r / 10
-            key = f"{raiting:.1f}"
-            rating_dist[key] = sum(r == raiting for r in ratings)
-        rating_dist.pop('10.0')    
-        return jsonify(rating_dist)
-    return jsonify({})
+    return distribution('charts/ratings', RATING_BINS, rating_distribution)
 
 @app.route('/api/charts/genres')
 def genres_data():
-    genres = []
-    for movie in movies_data:
-        try:
-            movie_genres = [g.strip() for g in movie['details']['Жанр'].split(',')]
-            genres.extend(movie_genres)
-        except (KeyError, AttributeError):
-            continue
-    
-    genre_counts = Counter(genres)
-    return jsonify(dict(genre_counts.most_common(15)))
+    return respond('charts/genres', lambda: g.snapshot.aggregate('charts/genres'))
 
 @app.route('/api/charts/durations')
 def durations_data():
-    durations = []
-    for movie in movies_data:
-        try:
-            duration = int(movie['details']['Время в минутах'])
-            durations.append(duration)
-        except (KeyError, ValueError):
-            continue
-    
-    if durations:
-        duration_dist = {}
-        for d in range(0, 301, 20):
-            key = f"{d}-{d+20} min"
-            duration_dist[key] = sum(d <= duration < d+20 for duration in durations)
-        return jsonify(duration_dist)
-    return jsonify({})
+    return distribution('charts/durations', DURATION_BINS, duration_distribution)
+
+# bundle part -> aggregate it serves
+BUNDLE_PARTS = {
+    'years': 'charts/years',
+    'boxoffice': 'charts/boxoffice',
+    'ratings': 'charts/ratings',
+    'genres': 'charts/genres',
+    'durations': 'charts/durations',
+    'stats': 'stats',
+}
+
+def chart_bundle(snapshot, include):
+    """Collects several chart aggregates at once; each is computed at most once per snapshot"""
+    return {part: snapshot.aggregate(BUNDLE_PARTS[part]) for part in include}
+
+def parse_bundle(value):
+    """Parses ?include= into bundle parts in their canonical order, all of them when absent"""
+    if value is None:
+        return list(BUNDLE_PARTS)
+    include = [p.strip() for p in value.split(',') if p.strip()]
+    unknown = [p for p in include if p not in BUNDLE_PARTS]
+    if unknown:
+        raise QueryError(f"Unknown charts: {', '.join(unknown)} (available: {', '.join(BUNDLE_PARTS)})")
+    if not include:
+        raise QueryError(f"include must name at least one chart (available: {', '.join(BUNDLE_PARTS)})")
+    return sorted(set(include), key=list(BUNDLE_PARTS).index)
+
+@app.route('/api/charts/bundle')
+def bundle_data():
+    """Returns several charts in one response, ?include= lists them (all by default)"""
+    try:
+        include = parse_bundle(request.args.get('include'))
+    except QueryError as e:
+        return {"error": str(e)}, 400
+    return respond(('charts/bundle', tuple(include)), lambda: chart_bundle(g.snapshot, include))
+
+@app.route('/api/analytics/correlation')
+def correlation_data():
+    """Correlation matrix of numeric fields, filtered by ?year_from=, ?year_to= and ?genre="""
+    snapshot = g.snapshot
+    args = request.args
+    method = args.get('method', 'pearson')
+    missing = args.get('missing', 'zero')
+    try:
+        if method not in CORRELATION_METHODS:
+            raise QueryError(f"Unknown method: {method}")
+        if missing not in MISSING_MODES:
+            raise QueryError(f"Unknown missing mode: {missing}")
+        fields = parse_fields(args.get('fields'), snapshot.store, CORRELATION_FIELDS)
+        mask = movie_filter(args, snapshot)
+    except QueryError as e:
+        return {"error": str(e)}, 400
+    return respond(
+        ('analytics/correlation', tuple(fields), method, missing, filter_key(args)),
+        lambda: correlation_matrix(snapshot.store, fields, mask, method, missing)
+    )
 
-class TrustedPeople(Resource):
-    def get(self):
-        actor_stats = {}
-        director_stats = {}
-
-        for m in movies_data:
-            title = m['title']
-            details = m.get('details', {})
-            rating = float(details.get('Рейтинг', 0)) or 0
-
-            directors_raw = details.get('Режиссер', '')
-            directors = [d.strip() for d in directors_raw.split(',') if d.strip()]
-            for director in directors:
-                if director not in director_stats:
-                    director_stats[director] = {'films': [], 'ratings': []}
-                director_stats[director]['films'].append(title)
-                director_stats[director]['ratings'].append(rating)
-
-            actors = details.get('Актеры', [])
-            for actor in actors:
-                if actor not in actor_stats:
-                    actor_stats[actor] = {'films': [], 'ratings': []}
-                actor_stats[actor]['films'].append(title)
-                actor_stats[actor]['ratings'].append(rating)
-
-        def format_person(name, stats, person_type):
-            avg_rating = round(sum(stats['ratings']) / len(stats['ratings']), 2) if stats['ratings'] else 0
-            return {
-                'name': name,
-                'type': person_type,
-                'filmCount': len(stats['films']),
-                'averageRating': avg_rating,
-                'films': stats['films']
-            }
-
-        top_actors = sorted(actor_stats.items(), key=lambda x: len(x[1]['films']), reverse=True)[:10]
-        top_directors = sorted(director_stats.items(), key=lambda x: len(x[1]['films']), reverse=True)[:7]
-
-        result = {
-            'topActors': [format_person(name, stats, 'actor') for name, stats in top_actors],
-            'topDirectors': [format_person(name, stats, 'director') for name, stats in top_directors],
-        }
-
-        return jsonify(result)          
+@app.route('/api/analytics/sentiment')
+def sentiment_data():
+    """Review sentiment summarised per ?by=genre|year|decade|film_type, filtered like the correlation matrix"""
+    snapshot = g.snapshot
+    args = request.args
+    by = args.get('by', 'genre')
+    try:
+        if by not in GROUPINGS:
+            raise QueryError(f"Unknown grouping: {by}")
+        mask = movie_filter(args, snapshot)
+    except QueryError as e:
+        return {"error": str(e)}, 400
+    return respond(
+        ('analytics/sentiment', by, filter_key(args)),
+        lambda: snapshot.sentiment.summary(by, mask)
+    )
 
+MAX_TOP_K = 100
 
+class TrustedPeople(Resource):
+    def get(self):
+        """Returns the most credited people, ?role=, ?k=, ?min_films= and ?sort=count|rating tune the selection"""
+        args = request.args
+        roles = [r.strip() for r in args.get('role', ','.join(DEFAULT_ROLES)).split(',') if r.strip()]
+        sort = args.get('sort', 'count')
+        try:
+            unknown = [r for r in roles if r not in ROLES]
+            if unknown or not roles:
+                raise QueryError(f"Unknown role: {', '.join(unknown)}")
+            if sort not in SORT_KEYS:
+                raise QueryError(f"Unknown sort key: {sort}")
+            k = parse_int(args, 'k', minimum=1)
+            if k is not None and k > MAX_TOP_K:
+                raise QueryError(f"k must be at most {MAX_TOP_K}")
+            min_films = parse_int(args, 'min_films', default=1, minimum=1)
+        except QueryError as e:
+            return {"error": str(e)}, 400
+
+        snapshot = g.snapshot
+        if (tuple(roles), k, min_films, sort) == (DEFAULT_ROLES, None, 1, 'count'):
+            build = lambda: snapshot.aggregate('trusted_people')
+        else:
+            build = lambda: trusted_people(snapshot.people, roles, k, min_films, sort)
+        return respond(('trusted_people', tuple(roles), k, min_films, sort), build)
+
+class Person(Resource):
+    def get(self, name):
+        """Returns the films and ratings of one person in every role they were credited in"""
+        person = g.snapshot.people.person(name)
+        if person is None:
+            return {"error": "Person not found"}, 404
+        return respond(('person', person['name']), lambda: person)
+
+MAX_SEARCH_RESULTS = 50
+
+class FullTextSearch(Resource):
+    def get(self):
+        """Returns the best matches of ?q= over titles, people, slogans and review keywords; prefixes match for typeahead"""
+        query = request.args.get('q', '').strip()
+        try:
+            if not query:
+                raise QueryError("q is required")
+            limit = parse_int(request.args, 'limit', default=10, minimum=1)
+            if limit > MAX_SEARCH_RESULTS:
+                raise QueryError(f"limit must be at most {MAX_SEARCH_RESULTS}")
+        except QueryError as e:
+            return {"error": str(e)}, 400
+
+        fulltext = g.snapshot.fulltext
+        return respond(
+            ('fulltext', query, limit),
+            lambda: {'query': query, **fulltext.search(query, limit)}
+        )
+
+
+api.add_resource(FullTextSearch, '/api/search')
 api.add_resource(TrustedPeople, '/api/trusted_people')
+api.add_resource(Person, '/api/people/<string:name>')
 api.add_resource(StatsByYear, '/api/stats/<int:end_year>')
 api.add_resource(Movies, '/api/movies')
+api.add_resource(MovieSearch, '/api/movies/search')
 api.add_resource(Movie, '/api/movies/<int:movie_id>')
 api.add_resource(MoviesByCountry, '/api/movies/country/<string:country>')
 api.add_resource(MoviesByGenre, '/api/movies/genre/<string:genre>')
 api.add_resource(Stats, '/api/stats')
 
+# default payloads built ahead of the first request (see gunicorn.conf.py)
+WARM_URLS = [
+    '/api/movies',
+    '/api/stats',
+    '/api/charts/years',
+    '/api/charts/boxoffice',
+    '/api/charts/ratings',
+    '/api/charts/genres',
+    '/api/charts/durations',
+    '/api/trusted_people',
+    '/api/charts/bundle?include=years,boxoffice,ratings,genres',
+]
+WARM_ENCODINGS = ['br', 'gzip', 'identity']
+
+def warm_up():
+    """Fills the response cache of the current snapshot with the default payloads and their compressed variants"""
+    client = app.test_client()
+    for url in WARM_URLS:
+        for encoding in WARM_ENCODINGS:
+            client.get(url, headers={'Accept-Encoding': encoding}, environ_overrides={metrics.WARM_UP_KEY: True})
+
+
+dataset.watch()
+
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000)
\ No newline at end of file
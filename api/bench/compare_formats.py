@@ -0,0 +1,89 @@
+"""Compares JSON and columnar MessagePack responses by size and decode time.
+
+Usage (from the api directory):
+    python bench/compare_formats.py [--repeat 20]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+
+import wire
+from app import app
+from store import NUMERIC_COLUMNS
+
+
+ENDPOINTS = [
+    '/api/movies',
+    '/api/movies?fields=title',
+    '/api/movies?fields=details.Рейтинг,details.Бюджет $',
+    '/api/stats',
+    '/api/stats/2000',
+]
+
+
+def fetch(client, url, mimetype, encoding='identity'):
+    resp = client.get(url, headers={'Accept': mimetype, 'Accept-Encoding': encoding})
+    return resp.data
+
+
+def decode_json(body):
+    """What a dashboard does today: parse, then pull numeric details out object by object"""
+    data = json.loads(body)
+    if isinstance(data, list):
+        columns = {}
+        for name, (key, _) in NUMERIC_COLUMNS.items():
+            values = []
+            for movie in data:
+                try:
+                    values.append(float(movie.get('details', {}).get(key)))
+                except (TypeError, ValueError):
+                    values.append(np.nan)
+            columns[name] = np.array(values)
+        return columns
+    return data
+
+
+def decode_msgpack(body):
+    """Reads the numeric columns and rebuilds the records, so both formats end with the same data"""
+    data = wire.unpack(body)
+    if isinstance(data, dict) and data.get('format') == 'columnar-v2':
+        columns = {name: wire.read_typed_array(column) for name, column in data['columns'].items()}
+        return columns, wire.read_columnar(data)
+    return data
+
+
+def timed(decode, body, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        decode(body)
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    if wire.msgpack is None:
+        sys.exit('msgpack is not installed')
+
+    client = app.test_client()
+    width = max(map(len, ENDPOINTS)) + 2
+    print(f"{'endpoint':<{width}}{'format':<10}{'raw KB':>10}{'gzip KB':>10}{'br KB':>10}{'decode ms':>12}")
+    for url in ENDPOINTS:
+        for name, mimetype, decode in (('json', wire.JSON, decode_json), ('msgpack', wire.MSGPACK, decode_msgpack)):
+            body = fetch(client, url, mimetype)
+            gz = fetch(client, url, mimetype, 'gzip')
+            br = fetch(client, url, mimetype, 'br')
+            print(f"{url:<{width}}{name:<10}{len(body) / 1024:>10.1f}{len(gz) / 1024:>10.1f}{len(br) / 1024:>10.1f}"
+                  f"{timed(decode, body, args.repeat):>12.2f}")
+
+
+if __name__ == '__main__':
+    main()
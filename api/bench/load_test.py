@@ -0,0 +1,312 @@
+"""Latency and throughput benchmark for every API route.
+
+Runs the app in-process through the Flask test client against the real
+dataset and against synthetic catalogs scaled from it, reports
+throughput and p50/p95/p99 latency per route, and compares the results
+with a stored baseline. Exits with status 1 when a route regresses past
+the threshold.
+
+Every case is measured warm (answered from the response cache) and cold
+(the cache emptied before every request, so the route computes its
+payload), keyed "catalog:case" and "catalog:case:cold".
+
+Absolute latencies depend on the host, so the comparison is relative: the
+median ratio of all results to the baseline is taken as the speed of this
+host against the baseline's, and a case regresses when it slows down by
+more than the threshold beyond that, and by at least --min-delta ms. A
+slowdown of every route alike does not fail the gate; it shows as the
+reported host factor. Cases that look regressed are measured again
+(--retries) and keep their best run, so one stall of a busy host does not
+fail it either. The baseline is still best regenerated (--update-baseline)
+on the host that runs the gate.
+
+Usage (from the api directory):
+    python bench/load_test.py                      # real + 1k/10k/100k, compare to baseline
+    python bench/load_test.py --sizes 1000 --requests 50
+    python bench/load_test.py --modes cold         # cache misses only
+    python bench/load_test.py --update-baseline    # record a new baseline
+    python bench/load_test.py --url http://localhost:5000 --concurrency 8
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+from urllib.request import Request, urlopen
+
+API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, API_DIR)
+os.environ.setdefault('DATA_RELOAD_INTERVAL', '0')
+
+import numpy as np
+
+import app as api_app
+from dataset import Snapshot
+from store import MovieStore
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# rule -> [(case name, url on the real dataset, url on scaled catalogs)]
+# full listings are paginated/projected on scaled catalogs: a 100k-movie dump is not a realistic request
+ROUTE_CASES = {
+    '/api/movies': [
+        ('movies', '/api/movies', '/api/movies?limit=100'),
+        ('movies projected page', '/api/movies?fields=title,details.Рейтинг&limit=100', None),
+    ],
+    '/api/movies/search': [
+        ('search', '/api/movies/search?genre=драма&year_from=1990&rating_from=8.5&sort=-rating&limit=20', None),
+    ],
+    '/api/movies/<int:movie_id>': [('movie', '/api/movies/1', None)],
+    '/api/movies/country/<string:country>': [
+        ('country', '/api/movies/country/Франция', '/api/movies/country/Франция?fields=title'),
+    ],
+    '/api/movies/genre/<string:genre>': [
+        ('genre', '/api/movies/genre/драма', '/api/movies/genre/драма?fields=title'),
+    ],
+    '/api/stats': [('stats', '/api/stats', None)],
+    '/api/stats/<int:end_year>': [('stats by year', '/api/stats/1990', None)],
+    '/api/charts/years': [('years', '/api/charts/years', None)],
+    '/api/charts/boxoffice': [('boxoffice', '/api/charts/boxoffice', None)],
+    # default binnings are precomputed; custom ones go through the histogram engine
+    '/api/charts/ratings': [
+        ('ratings', '/api/charts/ratings', None),
+        ('ratings custom bins', '/api/charts/ratings?bins=40&min=7', None),
+    ],
+    '/api/charts/genres': [('genres', '/api/charts/genres', None)],
+    '/api/charts/durations': [
+        ('durations', '/api/charts/durations', None),
+        ('durations log scale', '/api/charts/durations?bins=25&min=60&scale=log', None),
+    ],
+    '/api/charts/bundle': [('bundle', '/api/charts/bundle', None)],
+    '/api/analytics/correlation': [('correlation', '/api/analytics/correlation', None)],
+    '/api/analytics/sentiment': [
+        ('sentiment by genre', '/api/analytics/sentiment', None),
+        ('sentiment by decade', '/api/analytics/sentiment?by=decade', None),
+    ],
+    '/api/trusted_people': [('trusted people', '/api/trusted_people', None)],
+    '/api/people/<string:name>': [('person', '/api/people/Кристофер Нолан', None)],
+    '/api/search': [
+        ('fulltext', '/api/search?q=нолан', None),
+        ('fulltext typeahead', '/api/search?q=интерст', None),
+    ],
+    '/metrics': [('metrics', '/metrics', None)],
+}
+
+# routes that are not part of the API
+IGNORED_RULES = {'/static/<path:filename>'}
+
+
+def uncovered_routes():
+    rules = {rule.rule for rule in api_app.app.url_map.iter_rules()}
+    return sorted(rules - set(ROUTE_CASES) - IGNORED_RULES)
+
+
+def scaled_movies(movies, size, seed=0):
+    """Synthetic catalog of `size` movies built from the real ones.
+
+    Copies share the nested review analysis and cast lists of their source
+    movie, so memory stays modest; rank, title, year and rating vary.
+    """
+    rng = random.Random(seed)
+    scaled = []
+    for i in range(size):
+        base = movies[i % len(movies)]
+        details = dict(base['details'])
+        details['Топ 250'] = str(i + 1)
+        details['Год производства'] = str(min(2025, max(1900, int(details['Год производства']) + rng.randint(-15, 15))))
+        details['Рейтинг'] = f"{min(9.9, max(7.0, float(details['Рейтинг']) + rng.uniform(-0.5, 0.5))):.1f}"
+        suffix = '' if i < len(movies) else f' ({i // len(movies)})'
+        scaled.append({**base, 'title': base['title'] + suffix, 'details': details})
+    return scaled
+
+
+def use_catalog(movies, version):
+    """Points the app at an in-memory catalog"""
+    api_app.dataset._snapshot = Snapshot(MovieStore(movies, version=version))
+
+
+def summarize(latencies, elapsed):
+    latencies = np.array(latencies) * 1000
+    return {
+        'requests': len(latencies),
+        'throughput': round(len(latencies) / elapsed, 1),
+        'p50': round(float(np.percentile(latencies, 50)), 3),
+        'p95': round(float(np.percentile(latencies, 95)), 3),
+        'p99': round(float(np.percentile(latencies, 99)), 3),
+    }
+
+
+def run_client(url, requests, cold):
+    client = api_app.app.test_client()
+    response = client.get(url)
+    if response.status_code >= 400:
+        raise RuntimeError(f"{url} answered {response.status_code}")
+
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(requests):
+        if cold:
+            api_app.dataset.current.cache.clear()
+        t = time.perf_counter()
+        client.get(url)
+        latencies.append(time.perf_counter() - t)
+    return summarize(latencies, time.perf_counter() - started)
+
+
+def run_http(base_url, url, requests, concurrency):
+    target = base_url.rstrip('/') + quote(url, safe='/?=&,.')
+
+    def fetch(_):
+        t = time.perf_counter()
+        with urlopen(Request(target, headers={'Accept-Encoding': 'gzip'})) as resp:
+            resp.read()
+        return time.perf_counter() - t
+
+    fetch(None)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        latencies = list(pool.map(fetch, range(requests)))
+    return summarize(latencies, time.perf_counter() - started)
+
+
+def cases_for(catalog):
+    for rule, cases in ROUTE_CASES.items():
+        for name, url, scaled_url in cases:
+            yield name, scaled_url if catalog != 'real' and scaled_url else url
+
+
+def host_factor(results, baseline):
+    """How much slower this host runs than the baseline's: the median p95 ratio over the shared cases"""
+    ratios = [result['p95'] / baseline[key]['p95'] for key, result in results.items()
+              if key in baseline and baseline[key]['p95'] > 0]
+    return float(np.median(ratios)) if ratios else 1.0
+
+
+def regressed(key, result, reference, threshold, min_delta, factor=1.0):
+    """Returns how a case's p95 grew or throughput dropped by more than threshold, empty when it did not.
+
+    The reference is scaled by factor (see host_factor) first. Changes that
+    add less than min_delta milliseconds per request, to the p95 or to the
+    mean time a request takes (1000 / throughput), are treated as noise.
+    """
+    found = []
+    p95 = reference['p95'] * factor
+    throughput = reference['throughput'] / factor
+    if result['p95'] > p95 * (1 + threshold) and result['p95'] - p95 > min_delta:
+        found.append(f"{key}: p95 {p95:.3f} -> {result['p95']:.3f} ms")
+    if (result['throughput'] < throughput * (1 - threshold)
+            and 1000 / result['throughput'] - 1000 / throughput > min_delta):
+        found.append(f"{key}: throughput {throughput:.1f} -> {result['throughput']:.1f} req/s")
+    return found
+
+
+def compare(results, baseline, threshold, min_delta, factor=1.0):
+    """Returns the regressions of every case that has a baseline"""
+    return [message for key, result in results.items() if key in baseline
+            for message in regressed(key, result, baseline[key], threshold, min_delta, factor)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark every API route')
+    parser.add_argument('--sizes', default='1000,10000,100000', help='synthetic catalog sizes, empty for none')
+    parser.add_argument('--requests', type=int, default=200, help='timed requests per route')
+    parser.add_argument('--cold-requests', type=int, default=50, help='timed requests per route with an empty cache')
+    parser.add_argument('--modes', default='warm,cold',
+                        help='warm (cached responses) and/or cold (empty cache before every request)')
+    parser.add_argument('--url', help='benchmark a running server instead of the in-process app')
+    parser.add_argument('--concurrency', type=int, default=4, help='parallel requests with --url')
+    parser.add_argument('--threshold', type=float, default=0.25, help='allowed relative regression')
+    parser.add_argument('--min-delta', type=float, default=0.5, help='ignore slowdowns below this many ms per request')
+    parser.add_argument('--retries', type=int, default=2,
+                        help='remeasure a case that looks regressed up to this many times, keeping its best run')
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--update-baseline', action='store_true')
+    parser.add_argument('--output', help='write the results as JSON')
+    args = parser.parse_args()
+
+    modes = [mode.strip() for mode in args.modes.split(',') if mode.strip()]
+    if not modes or set(modes) - {'warm', 'cold'}:
+        parser.error('--modes takes warm, cold or both')
+    if args.url and 'cold' in modes:
+        # a running server's cache cannot be emptied from here
+        modes.remove('cold')
+
+    missing = uncovered_routes()
+    if missing:
+        sys.exit(f"Routes without a benchmark case: {', '.join(missing)}")
+
+    catalogs = ['real']
+    if not args.url:
+        catalogs += [int(size) for size in args.sizes.split(',') if size.strip()]
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    gate = bool(baseline) and not (args.url or args.update_baseline)
+
+    def measure(url, mode):
+        if args.url:
+            return run_http(args.url, url, args.requests, args.concurrency)
+        if mode == 'cold':
+            return run_client(url, args.cold_requests, cold=True)
+        return run_client(url, args.requests, cold=False)
+
+    real_movies = api_app.dataset.current.movies
+    results = {}
+    print(f"{'catalog':<9}{'case':<29}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for catalog in catalogs:
+        if catalog != 'real':
+            started = time.perf_counter()
+            use_catalog(scaled_movies(real_movies, catalog), version=f'bench-{catalog}')
+            print(f"-- {catalog} movies loaded in {time.perf_counter() - started:.1f}s")
+        measured = {}
+        for name, url in cases_for(catalog):
+            for mode in modes:
+                result = measure(url, mode)
+                case = f"{name}{':cold' if mode == 'cold' else ''}"
+                results[f"{catalog}:{case}"] = result
+                measured[f"{catalog}:{case}"] = (url, mode)
+                print(f"{str(catalog):<9}{case:<29}{result['throughput']:>10.1f}{result['p50']:>10.3f}"
+                      f"{result['p95']:>10.3f}{result['p99']:>10.3f}")
+        # a stall of the host during one run should not fail the gate: measure suspects again
+        for _ in range(args.retries if gate else 0):
+            factor = host_factor(results, baseline)
+            suspects = [key for key in measured if key in baseline
+                        and regressed(key, results[key], baseline[key], args.threshold, args.min_delta, factor)]
+            if not suspects:
+                break
+            print(f"-- remeasuring {len(suspects)} case(s) that look regressed")
+            for key in suspects:
+                result = measure(*measured[key])
+                if result['p95'] < results[key]['p95']:
+                    results[key] = result
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+    if args.update_baseline:
+        baseline.update(results)
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, ensure_ascii=False, indent=2, sort_keys=True)
+        print(f"Baseline written to {args.baseline}")
+        return
+
+    if not gate:
+        return
+    factor = host_factor(results, baseline)
+    print(f"\nThis host runs at {factor:.2f}x the baseline's latency (median over all cases)")
+    regressions = compare(results, baseline, args.threshold, args.min_delta, factor)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.threshold:.0%}:")
+        print('\n'.join(regressions))
+        sys.exit(1)
+    print(f"\nNo regressions over {args.threshold:.0%} against {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
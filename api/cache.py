@@ -0,0 +1,185 @@
+import gzip
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from flask import Response, request
+
+import metrics
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+
+# bodies smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 512
+# total size of the cached bodies and their compressed variants, per process;
+# least recently used payloads are evicted first
+MAX_BYTES = int(os.environ.get('RESPONSE_CACHE_MB', 64)) << 20
+
+# default payloads are compressed once (ahead of time, see app.warm_up) and
+# served many times, so they get the smallest encoding; query-dependent ones
+# are compressed on the request that misses, so they get a fast one
+LEVELS = {
+    True: {'gzip': 9, 'br': 11},
+    False: {'gzip': 6, 'br': 4},
+}
+
+
+def serialize(data):
+    """Compact JSON encoding shared by every cached payload"""
+    return json.dumps(data, ensure_ascii=False, separators=(',', ':'), sort_keys=True).encode('utf-8')
+
+
+def compress(body, encoding, level):
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=level, mtime=0)
+    return brotli.compress(body, quality=level)
+
+
+class CachedPayload:
+    """A response body serialized once; its compressed variants are built when first asked for"""
+
+    ETAG_SUFFIXES = {'identity': '', 'gzip': '-gz', 'br': '-br'}
+
+    def __init__(self, body, mimetype='application/json', static=True):
+        self.mimetype = mimetype
+        self.levels = LEVELS[static]
+        self.digest = hashlib.sha1(body).hexdigest()[:20]
+        self.variants = {'identity': body}
+
+    @property
+    def size(self):
+        return sum(len(body) for body in self.variants.values())
+
+    @property
+    def encodings(self):
+        if len(self.variants['identity']) < MIN_COMPRESS_SIZE:
+            return ['identity']
+        return (['br'] if brotli is not None else []) + ['gzip', 'identity']
+
+    @property
+    def etags(self):
+        return [self.etag(encoding) for encoding in self.encodings]
+
+    def etag(self, encoding):
+        return self.digest + self.ETAG_SUFFIXES[encoding]
+
+    def choose(self, accept_encodings):
+        """Picks the smallest variant the client accepts"""
+        for encoding in self.encodings[:-1]:
+            if accept_encodings[encoding]:
+                return encoding
+        return 'identity'
+
+    def compress(self, encoding):
+        return compress(self.variants['identity'], encoding, self.levels[encoding])
+
+
+class ResponseCache:
+    """Serialized responses for one dataset version.
+
+    Every dataset-derived payload is encoded once and compressed once per
+    encoding clients ask for; requests are answered with the variant
+    matching Accept-Encoding, a strong ETag and 304 Not Modified when the
+    client already has it. A new dataset version gets a new cache, so
+    nothing stale can be served.
+    """
+
+    def __init__(self, version=None, max_bytes=MAX_BYTES):
+        self.version = version
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def _charge(self, key, entry, added):
+        """Accounts for added bytes of an entry and evicts the least recently used ones over the budget"""
+        self.size += added
+        while self.size > self.max_bytes and len(self._entries) > 1:
+            _, evicted = self._entries.popitem(last=False)
+            self.size -= evicted.size
+        # an entry larger than the whole budget is served but not kept
+        if self.size > self.max_bytes and self._entries.get(key) is entry:
+            del self._entries[key]
+            self.size -= entry.size
+
+    def payload(self, key, build, encode=serialize, mimetype='application/json', static=True):
+        """Returns the cached payload for key, building it on first use"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                metrics.cache_result(hit=True)
+                return entry
+
+        metrics.cache_result(hit=False)
+        # built outside the lock; concurrent misses may both build, the result is identical
+        with metrics.stage('compute'):
+            data = build()
+        with metrics.stage('serialize'):
+            body = encode(data)
+        entry = CachedPayload(body, mimetype, static)
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self.size -= previous.size
+            self._entries[key] = entry
+            self._charge(key, entry, entry.size)
+        return entry
+
+    def variant(self, key, entry, encoding):
+        """Returns the body of entry in encoding, compressing it on first use"""
+        body = entry.variants.get(encoding)
+        if body is not None:
+            return body
+        # compressed outside the lock; concurrent requests may both compress, the result is identical
+        with metrics.stage('compress'):
+            body = entry.compress(encoding)
+        with self._lock:
+            if encoding in entry.variants:
+                return entry.variants[encoding]
+            entry.variants[encoding] = body
+            if self._entries.get(key) is entry:
+                self._entries.move_to_end(key)
+                self._charge(key, entry, len(body))
+        return body
+
+    def respond(self, key, build, encode=serialize, mimetype='application/json', static=True):
+        """Returns a response for the payload cached under key, honouring conditional requests.
+
+        static payloads (no query or path parameters) are compressed
+        harder, since they are built once and served many times.
+        """
+        entry = self.payload(key, build, encode, mimetype, static)
+        encoding = entry.choose(request.accept_encodings)
+
+        if any(request.if_none_match.contains_weak(etag) for etag in entry.etags):
+            resp = Response(status=304)
+        else:
+            body = self.variant(key, entry, encoding)
+            resp = Response(body, mimetype=mimetype)
+            if encoding != 'identity':
+                resp.headers['Content-Encoding'] = encoding
+            if mimetype == 'application/json':
+                resp.headers['Content-Type'] = 'application/json; charset=utf-8'
+
+        resp.set_etag(entry.etag(encoding))
+        resp.headers['Vary'] = 'Accept, Accept-Encoding'
+        resp.headers['Cache-Control'] = 'no-cache'
+        return resp
@@ -0,0 +1,57 @@
+from collections import Counter
+
+from histogram import HistogramSpec, histogram, labelled
+from people import ROLES
+
+
+def count_genres(store):
+    return Counter(genre for genres in store.genres for genre in genres)
+
+def overall_stats(store):
+    """Returns movie statistics"""
+    ratings = store.values('rating')
+    return {
+        "total_movies": store.size,
+        "countries": dict(Counter(store.country_labels)),
+        "genres": dict(count_genres(store)),
+        "average_rating": float(ratings.mean()) if ratings.size else 0
+    }
+
+def year_counts(store):
+    years = store.values('year').astype(int)
+    year_counts = Counter(str(year) for year in years)
+    return dict(sorted(year_counts.items()))
+
+# default binning of each chart, overridable with ?bins=, ?min=, ?max= and ?scale=log
+BOXOFFICE_BINS = HistogramSpec(30)
+RATING_BINS = HistogramSpec(30, 7.0, 10.0)
+DURATION_BINS = HistogramSpec(16, 0, 320)
+
+def boxoffice_distribution(store, spec=BOXOFFICE_BINS):
+    result = histogram(store.values('gross_world'), spec)
+    if result is None:
+        return {}
+    return labelled(*result, lambda lo, hi, p: f"{lo:.{p}f}-{hi:.{p}f}", decimals=0)
+
+def rating_distribution(store, spec=RATING_BINS):
+    result = histogram(store.values('rating'), spec)
+    if result is None:
+        return {}
+    return labelled(*result, lambda lo, hi, p: f"{lo:.{p}f}", decimals=1)
+
+def top_genres(store):
+    return dict(count_genres(store).most_common(15))
+
+def duration_distribution(store, spec=DURATION_BINS):
+    result = histogram(store.values('runtime'), spec)
+    if result is None:
+        return {}
+    return labelled(*result, lambda lo, hi, p: f"{lo:.{p}f}-{hi:.{p}f} min", decimals=0)
+
+DEFAULT_ROLES = ('actor', 'director')
+
+def trusted_people(people, roles=DEFAULT_ROLES, k=None, min_films=1, sort='count'):
+    return {
+        ROLES[role][1]: people.top(role, k or ROLES[role][2], min_films, sort)
+        for role in roles
+    }
@@ -0,0 +1,138 @@
+import logging
+import os
+import threading
+import time
+
+from aggregates import YearStatsIndex
+from cache import ResponseCache
+from fulltext import FullTextIndex
+from indexes import LookupIndex
+from people import PersonIndex
+from search import SearchIndex
+from sentiment import SentimentIndex
+from materialize import default_aggregates, read_aggregates
+import metrics
+from store import MovieStore
+
+logger = logging.getLogger(__name__)
+
+
+def validate(movies):
+    """Rejects files that cannot be served, so a bad preprocessing run never replaces a good dataset"""
+    if not isinstance(movies, list) or not movies:
+        raise ValueError("dataset must be a non-empty list of movies")
+    for position, movie in enumerate(movies):
+        if not isinstance(movie, dict) or not isinstance(movie.get('details'), dict):
+            raise ValueError(f"movie #{position} has no details")
+        if not movie.get('title'):
+            raise ValueError(f"movie #{position} has no title")
+
+
+class Snapshot:
+    """One version of the dataset together with everything derived from it.
+
+    Snapshots are immutable once built; a reload builds a new one and swaps
+    the reference, so requests holding the old snapshot finish on it.
+    """
+
+    def __init__(self, store, aggregates=None):
+        self.store = store
+        self.version = store.version
+        self.movies = store.movies
+        self.year_stats = YearStatsIndex(store)
+        self.lookup = LookupIndex(store)
+        self.people = PersonIndex(store)
+        self.search = SearchIndex(store, self.lookup, self.people)
+        self.fulltext = FullTextIndex(store)
+        self.sentiment = SentimentIndex(store)
+        self.cache = ResponseCache(store.version)
+        self._builders = default_aggregates(store, self.year_stats, self.people)
+        # precomputed by preprocessing when available, filled in on first use otherwise
+        self._aggregates = dict(aggregates or {})
+
+    def aggregate(self, name):
+        """Returns a default chart/stats payload, from the precomputed file when it matches this version"""
+        if name not in self._aggregates:
+            self._aggregates[name] = self._builders[name]()
+        return self._aggregates[name]
+
+    @classmethod
+    def load(cls, path, kind='initial'):
+        started = time.perf_counter()
+        store = MovieStore.load(path)
+        validate(store.movies)
+        snapshot = cls(store, read_aggregates(path, store.version))
+        metrics.dataset_loaded(snapshot, time.perf_counter() - started, kind)
+        return snapshot
+
+
+def file_signature(path):
+    stat = os.stat(path)
+    return (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+class Dataset:
+    """Holds the current snapshot and reloads it when the file on disk changes"""
+
+    def __init__(self, path, poll_interval=0):
+        self.path = path
+        self.poll_interval = poll_interval
+        self._lock = threading.Lock()
+        self._signature = file_signature(path)
+        self._snapshot = Snapshot.load(path)
+        self._watcher = None
+        self._stop = threading.Event()
+        # called with the new snapshot after every successful swap
+        self.listeners = []
+
+    @property
+    def current(self):
+        return self._snapshot
+
+    def reload(self):
+        """Loads, validates and swaps in the file on disk; keeps the current snapshot on failure"""
+        with self._lock:
+            signature = file_signature(self.path)
+            try:
+                snapshot = Snapshot.load(self.path, kind='reload')
+            except Exception as e:
+                # any error building the store or its indexes, not only a bad file, keeps the current snapshot
+                metrics.dataset_reload_failures.inc()
+                logger.error("Keeping dataset %s, failed to load %s: %s", self._snapshot.version, self.path, e,
+                             exc_info=not isinstance(e, (OSError, ValueError)))
+                self._signature = signature
+                return False
+            self._signature = signature
+            if snapshot.version == self._snapshot.version:
+                return False
+            logger.info("Dataset %s replaced by %s", self._snapshot.version, snapshot.version)
+            self._snapshot = snapshot
+        for listener in self.listeners:
+            listener(snapshot)
+        return True
+
+    def changed(self):
+        try:
+            return file_signature(self.path) != self._signature
+        except OSError:  # mid-replace, pick it up on the next poll
+            return False
+
+    def watch(self):
+        """Starts polling the file for changes in a daemon thread"""
+        if self.poll_interval <= 0 or (self._watcher and self._watcher.is_alive()):
+            return
+        self._watcher = threading.Thread(target=self._poll, name='dataset-watcher', daemon=True)
+        self._watcher.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _poll(self):
+        while not self._stop.wait(self.poll_interval):
+            if not self.changed():
+                continue
+            # the watcher must survive anything (e.g. a failing listener), or reloading stops silently
+            try:
+                self.reload()
+            except Exception:
+                logger.exception("Reloading %s failed", self.path)
@@ -0,0 +1,169 @@
+import re
+from array import array
+from bisect import bisect_left
+from collections import Counter
+
+import numpy as np
+
+from indexes import normalize_token
+
+
+# searchable field -> weight of a token found in it
+FIELD_WEIGHTS = {
+    'title': 5.0,
+    'directors': 3.0,
+    'actors': 2.0,
+    'slogan': 1.0,
+    'keywords': 1.0,
+}
+FIELD_BITS = {name: 1 << i for i, name in enumerate(FIELD_WEIGHTS)}
+
+# how much a query term is worth when it matches a token exactly, as a prefix, or by trigrams
+EXACT, PREFIX, TRIGRAM = 1.0, 0.6, 0.4
+# a term expands to at most this many tokens, which keeps typeahead latency flat as the vocabulary grows
+MAX_EXPANSIONS = 50
+# minimum trigram similarity (Jaccard) of a fuzzy match
+MIN_SIMILARITY = 0.4
+
+WORD = re.compile(r'\w+')
+
+
+def tokenize(text):
+    """Splits text into case- and ё-folded words"""
+    if not isinstance(text, str):
+        return []
+    return WORD.findall(normalize_token(text))
+
+
+def trigrams(token):
+    padded = f' {token} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def field_texts(store, position):
+    """Yields (field, text) for every searchable text of one movie"""
+    details = store.movies[position].get('details') or {}
+    yield 'title', store.titles[position]
+    for name in store.directors[position]:
+        yield 'directors', name
+    for name in store.actors[position]:
+        yield 'actors', name
+    yield 'slogan', details.get('Слоган')
+    for keyword in (details.get('Анализ_рецензий') or {}).get('keywords') or []:
+        yield 'keywords', keyword
+
+
+class FullTextIndex:
+    """Inverted index over titles, people, slogans and review keywords.
+
+    Postings live in flat numpy arrays grouped by token (positions, weights,
+    matched-field bits), so a query only touches the postings of the tokens
+    it matches. Tokens are sorted for prefix lookups and trigram-indexed for
+    fuzzy and infix matches.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        vocabulary = {}
+        token_ids, positions, weights, fields = array('i'), array('i'), array('f'), array('B')
+        for position in range(store.size):
+            movie_tokens = {}
+            for field, text in field_texts(store, position):
+                for token in tokenize(text):
+                    weight, bits = movie_tokens.get(token, (0.0, 0))
+                    if not bits & FIELD_BITS[field]:
+                        weight += FIELD_WEIGHTS[field]
+                    movie_tokens[token] = (weight, bits | FIELD_BITS[field])
+            for token, (weight, bits) in movie_tokens.items():
+                token_ids.append(vocabulary.setdefault(token, len(vocabulary)))
+                positions.append(position)
+                weights.append(weight)
+                fields.append(bits)
+
+        # renumber tokens in sorted order so that a prefix is a contiguous id range
+        self.tokens = sorted(vocabulary)
+        renumber = np.empty(len(vocabulary), dtype=np.int32)
+        renumber[[vocabulary[t] for t in self.tokens]] = np.arange(len(self.tokens), dtype=np.int32)
+        token_ids = renumber[np.frombuffer(token_ids, dtype=np.int32)] if len(token_ids) else np.empty(0, np.int32)
+
+        order = np.argsort(token_ids, kind='stable')
+        self.positions = np.frombuffer(positions, dtype=np.int32)[order]
+        self.weights = np.frombuffer(weights, dtype=np.float32)[order]
+        self.fields = np.frombuffer(fields, dtype=np.uint8)[order]
+        counts = np.bincount(token_ids, minlength=len(self.tokens))
+        self.offsets = np.concatenate([[0], np.cumsum(counts)])
+        self.idf = np.log1p(store.size / np.maximum(counts, 1))
+
+        self.by_trigram = {}
+        for token_id, token in enumerate(self.tokens):
+            for trigram in trigrams(token):
+                self.by_trigram.setdefault(trigram, []).append(token_id)
+
+    def expand(self, term):
+        """Returns (token id, factor) for the tokens a query term matches"""
+        start = bisect_left(self.tokens, term)
+        matches = []
+        for token_id in range(start, min(start + MAX_EXPANSIONS, len(self.tokens))):
+            token = self.tokens[token_id]
+            if not token.startswith(term):
+                break
+            matches.append((token_id, EXACT if token == term else PREFIX))
+        if matches or len(term) < 3:
+            return matches
+
+        wanted = trigrams(term)
+        shared = Counter(t for trigram in wanted for t in self.by_trigram.get(trigram, ()))
+        fuzzy = []
+        for token_id, common in shared.items():
+            similarity = common / (len(wanted) + len(trigrams(self.tokens[token_id])) - common)
+            if similarity >= MIN_SIMILARITY:
+                fuzzy.append((similarity, token_id))
+        fuzzy.sort(key=lambda item: (-item[0], item[1]))
+        return [(token_id, TRIGRAM * similarity) for similarity, token_id in fuzzy[:MAX_EXPANSIONS]]
+
+    def match(self, term):
+        """Returns the positions matching one term with their best score and matched-field bits"""
+        slices = [(slice(self.offsets[t], self.offsets[t + 1]), factor * self.idf[t]) for t, factor in self.expand(term)]
+        if not slices:
+            return np.empty(0, np.int32), np.empty(0), np.empty(0, np.uint8)
+        positions = np.concatenate([self.positions[s] for s, _ in slices])
+        scores = np.concatenate([self.weights[s] * factor for s, factor in slices])
+        fields = np.concatenate([self.fields[s] for s, _ in slices])
+
+        order = np.lexsort((-scores, positions))
+        positions, scores, fields = positions[order], scores[order], fields[order]
+        starts = np.flatnonzero(np.r_[True, positions[1:] != positions[:-1]])
+        return positions[starts], scores[starts], np.bitwise_or.reduceat(fields, starts)
+
+    def search(self, query, limit=10):
+        """Ranks the movies matching every term of query; the best `limit` are described"""
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return {'total': 0, 'results': []}
+
+        positions, scores, fields = self.match(terms[0])
+        for term in terms[1:]:
+            if not len(positions):
+                break
+            other_positions, other_scores, other_fields = self.match(term)
+            positions, mine, theirs = np.intersect1d(positions, other_positions, assume_unique=True, return_indices=True)
+            scores = scores[mine] + other_scores[theirs]
+            fields = fields[mine] | other_fields[theirs]
+
+        best = np.lexsort((positions, -scores))[:limit]
+        return {
+            'total': int(len(positions)),
+            'results': [self.describe(int(positions[i]), float(scores[i]), int(fields[i])) for i in best],
+        }
+
+    def describe(self, position, score, bits):
+        store = self.store
+        rank, year, rating = (store.column(name)[position] for name in ('rank', 'year', 'rating'))
+        return {
+            'rank': None if np.isnan(rank) else int(rank),
+            'title': store.titles[position],
+            'year': None if np.isnan(year) else int(year),
+            'rating': None if np.isnan(rating) else float(rating),
+            'score': round(score, 3),
+            'matched': [name for name, bit in FIELD_BITS.items() if bits & bit],
+        }
@@ -0,0 +1,61 @@
+# Production serving: gunicorn -c gunicorn.conf.py app:app
+#
+# The app (dataset, indexes, warmed response cache) is loaded once in the
+# master and workers are forked from it, so they share that memory
+# copy-on-write. The master also watches the dataset file: after a reload
+# it sends itself SIGHUP, which gracefully replaces the workers with new
+# ones forked from the updated master while old workers finish their
+# in-flight requests.
+#
+# Metrics are recorded by every process into PROMETHEUS_MULTIPROC_DIR (a new
+# temporary directory unless set), which /metrics merges; see metrics.py.
+import gc
+import multiprocessing
+import os
+import signal
+import sys
+import tempfile
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+threads = int(os.environ.get('GUNICORN_THREADS', 4))
+worker_class = 'gthread'
+preload_app = True
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+accesslog = '-'
+
+# set before the app is imported, and emptied so a new server does not count the
+# previous one; SIGHUP reads this file again, which must keep the running totals
+if 'PROMETHEUS_MULTIPROC_DIR' not in os.environ:
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = tempfile.mkdtemp(prefix='api-metrics-')
+metrics_dir = os.environ['PROMETHEUS_MULTIPROC_DIR']
+if os.environ.get('API_METRICS_DIR_EMPTIED') != metrics_dir:
+    os.makedirs(metrics_dir, exist_ok=True)
+    for name in os.listdir(metrics_dir):
+        if name.endswith('.db'):
+            os.remove(os.path.join(metrics_dir, name))
+    os.environ['API_METRICS_DIR_EMPTIED'] = metrics_dir
+
+
+def share_with_workers():
+    """Warms the current snapshot and freezes it out of the GC, so forked workers don't touch its pages"""
+    sys.modules['app'].warm_up()
+    gc.collect()
+    gc.freeze()
+
+
+def when_ready(server):
+    share_with_workers()
+
+    def restart_workers(snapshot):
+        share_with_workers()
+        server.log.info("Dataset %s loaded, restarting workers", snapshot.version)
+        os.kill(server.pid, signal.SIGHUP)
+
+    sys.modules['app'].dataset.listeners.append(restart_workers)
+
+
+def child_exit(server, worker):
+    sys.modules['metrics'].worker_exited(worker.pid)
@@ -0,0 +1,93 @@
+import numpy as np
+
+from projection import QueryError, parse_int
+
+
+MAX_BINS = 1000
+
+
+def parse_float(args, name):
+    value = args.get(name)
+    if value is None or value == '':
+        return None
+    try:
+        number = float(value)
+    except ValueError:
+        raise QueryError(f"{name} must be a number")
+    if not np.isfinite(number):
+        raise QueryError(f"{name} must be finite")
+    return number
+
+
+class HistogramSpec:
+    """Binning parameters of a chart: bin count, optional fixed range and scale"""
+
+    def __init__(self, bins, lo=None, hi=None, log=False):
+        self.bins = bins
+        self.lo = lo
+        self.hi = hi
+        self.log = log
+
+    @classmethod
+    def from_args(cls, args, default):
+        """Overrides the chart's default spec with ?bins=, ?min=, ?max= and ?scale=log"""
+        bins = parse_int(args, 'bins', default=default.bins, minimum=1)
+        if bins > MAX_BINS:
+            raise QueryError(f"bins must be at most {MAX_BINS}")
+        lo = parse_float(args, 'min')
+        hi = parse_float(args, 'max')
+        scale = args.get('scale', 'log' if default.log else 'linear')
+        if scale not in ('linear', 'log'):
+            raise QueryError(f"Unknown scale: {scale}")
+        spec = cls(bins, default.lo if lo is None else lo, default.hi if hi is None else hi, scale == 'log')
+        if spec.lo is not None and spec.hi is not None and spec.lo >= spec.hi:
+            raise QueryError("min must be less than max")
+        if spec.log and spec.lo is not None and spec.lo <= 0:
+            raise QueryError("min must be positive for log scale")
+        return spec
+
+    @property
+    def key(self):
+        return (self.bins, self.lo, self.hi, self.log)
+
+
+def histogram(values, spec):
+    """Counts values into spec.bins bins; returns the bin edges and counts, or None without data.
+
+    Bins are half-open except the last one, which includes the upper edge,
+    so the maximum value is always counted. Values outside a fixed range
+    are ignored.
+    """
+    values = values[np.isfinite(values)]
+    if spec.log:
+        values = values[values > 0]
+    if not len(values):
+        return None
+
+    lo = values.min() if spec.lo is None else spec.lo
+    hi = values.max() if spec.hi is None else spec.hi
+    if lo == hi:
+        hi = lo + 1
+
+    if spec.log:
+        edges = np.geomspace(lo, hi, spec.bins + 1)
+    else:
+        edges = np.linspace(lo, hi, spec.bins + 1)
+    # snap edges like 7.3000000000000007 back onto the decimal grid values are parsed from
+    edges = np.round(edges, 9)
+
+    counts, _ = np.histogram(values, bins=edges)
+    return edges, counts
+
+
+def labelled(edges, counts, label, decimals):
+    """Turns a histogram into an ordered {label: count} dict.
+
+    Adds decimals until every label is distinct, so fine bins never collapse
+    into one key.
+    """
+    for precision in range(decimals, decimals + 10):
+        labels = [label(edges[i], edges[i + 1], precision) for i in range(len(counts))]
+        if len(set(labels)) == len(labels):
+            break
+    return {key: int(count) for key, count in zip(labels, counts)}
@@ -0,0 +1,66 @@
+from bisect import bisect_left
+
+
+def normalize_token(value):
+    """Case- and ё-folds a country/genre token so lookups ignore spelling variants"""
+    return ' '.join(value.casefold().replace('ё', 'е').split())
+
+
+class TokenIndex:
+    """Inverted index from a normalized token to the positions of movies carrying it"""
+
+    def __init__(self, lists):
+        self.postings = {}
+        for position, tokens in enumerate(lists):
+            for token in tokens:
+                posting = self.postings.setdefault(normalize_token(token), [])
+                if not posting or posting[-1] != position:
+                    posting.append(position)
+        self.tokens = sorted(self.postings)
+
+    def exact(self, value):
+        """Returns positions of movies with a token equal to value"""
+        return self.postings.get(normalize_token(value), [])
+
+    def prefix(self, value):
+        """Returns positions of movies with a token starting with value"""
+        prefix = normalize_token(value)
+        matched = set()
+        for i in range(bisect_left(self.tokens, prefix), len(self.tokens)):
+            if not self.tokens[i].startswith(prefix):
+                break
+            matched.update(self.postings[self.tokens[i]])
+        return sorted(matched)
+
+    def lookup(self, value, match='exact'):
+        if match == 'prefix':
+            return self.prefix(value)
+        return self.exact(value)
+
+
+class LookupIndex:
+    """Hash indexes behind the single-movie, country and genre endpoints"""
+
+    MATCH_MODES = ('exact', 'prefix')
+
+    def __init__(self, store):
+        self.store = store
+        self.by_rank = {
+            int(rank): position
+            for position, rank in enumerate(store.column('rank'))
+            if store.mask('rank')[position]
+        }
+        self.countries = TokenIndex(store.countries)
+        self.genres = TokenIndex(store.genres)
+
+    def movie_by_rank(self, rank):
+        position = self.by_rank.get(rank)
+        if position is None:
+            return None
+        return self.store.movies[position]
+
+    def movies_by_country(self, country, match='exact'):
+        return [self.store.movies[i] for i in self.countries.lookup(country, match)]
+
+    def movies_by_genre(self, genre, match='exact'):
+        return [self.store.movies[i] for i in self.genres.lookup(genre, match)]
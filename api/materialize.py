@@ -0,0 +1,87 @@
+"""Aggregates every default chart and stats payload of a dataset ahead of time.
+
+The preprocessing pipeline writes them next to the dataset file
+(optimized_data.json -> optimized_data.aggregates.json), stamped with the
+dataset version they were computed from. The API serves them as-is when
+the stamp matches the file it loaded, and computes them live otherwise.
+
+Usage: python materialize.py data/optimized_data.json
+"""
+import json
+import logging
+import os
+import sys
+
+from aggregates import YearStatsIndex
+from charts import (
+    boxoffice_distribution, duration_distribution, overall_stats,
+    rating_distribution, top_genres, trusted_people, year_counts
+)
+from people import PersonIndex
+from store import MovieStore
+
+logger = logging.getLogger(__name__)
+
+# bump whenever an aggregate changes shape or meaning, so stale files are ignored
+AGGREGATES_FORMAT = 1
+
+
+def default_aggregates(store, year_stats, people):
+    """name -> builder of every aggregate served with default parameters"""
+    builders = {
+        'stats': lambda: overall_stats(store),
+        'charts/years': lambda: year_counts(store),
+        'charts/boxoffice': lambda: boxoffice_distribution(store),
+        'charts/ratings': lambda: rating_distribution(store),
+        'charts/genres': lambda: top_genres(store),
+        'charts/durations': lambda: duration_distribution(store),
+        'trusted_people': lambda: trusted_people(people),
+    }
+    for year in year_stats.years:
+        builders[f'stats/{year}'] = lambda year=year: year_stats.stats_until(year)
+    return builders
+
+
+def aggregates_path(data_path):
+    root, _ = os.path.splitext(data_path)
+    return root + '.aggregates.json'
+
+
+def write_aggregates(store, data_path):
+    """Computes the aggregates of a loaded dataset and writes them next to data_path.
+
+    Write them before the dataset file itself is replaced, so an API watching
+    the file finds matching aggregates as soon as it reloads.
+    """
+    builders = default_aggregates(store, YearStatsIndex(store), PersonIndex(store))
+    document = {
+        'format': AGGREGATES_FORMAT,
+        'version': store.version,
+        'aggregates': {name: build() for name, build in builders.items()},
+    }
+    path = aggregates_path(data_path)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(document, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(path + '.tmp', path)
+    return path
+
+
+def read_aggregates(data_path, version):
+    """Returns the precomputed aggregates for this dataset version, or {} to compute them live"""
+    path = aggregates_path(data_path)
+    try:
+        with open(path, encoding='utf-8') as f:
+            document = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logger.warning("Ignoring unreadable aggregates %s: %s", path, e)
+        return {}
+    if document.get('format') != AGGREGATES_FORMAT or document.get('version') != version:
+        logger.info("Ignoring aggregates %s made for another dataset version", path)
+        return {}
+    return document.get('aggregates') or {}
+
+
+if __name__ == '__main__':
+    print(write_aggregates(MovieStore.load(sys.argv[1]), sys.argv[1]))
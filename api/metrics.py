@@ -0,0 +1,145 @@
+"""In-process instrumentation exposed in the Prometheus text format at /metrics.
+
+Under gunicorn every worker records into files in PROMETHEUS_MULTIPROC_DIR
+(gunicorn.conf.py sets one up), and /metrics merges the files of all
+workers and the master, so whichever worker answers a scrape reports the
+totals of the whole server and rate()/sum() work as usual. Without that
+directory (e.g. the Flask dev server) the metrics live in this process.
+"""
+import os
+import time
+from contextlib import contextmanager
+
+from flask import Response, g, has_request_context, request
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram,
+                               generate_latest, multiprocess)
+
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+LOAD_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+request_duration = Histogram(
+    'api_request_duration_seconds', 'Request latency by route', ('route', 'method', 'status'),
+    buckets=LATENCY_BUCKETS)
+stage_duration = Histogram(
+    'api_stage_duration_seconds', 'Time spent building (compute), encoding (serialize) and compressing payloads',
+    ('route', 'stage'), buckets=LATENCY_BUCKETS)
+response_bytes = Counter(
+    'api_response_bytes_total', 'Response body bytes sent by route', ('route',))
+cache_requests = Counter(
+    'api_cache_requests_total', 'Response cache lookups by route and result', ('route', 'result'))
+dataset_load_duration = Histogram(
+    'api_dataset_load_seconds', 'Time to load, validate and index the dataset', ('kind',), buckets=LOAD_BUCKETS)
+dataset_reload_failures = Counter(
+    'api_dataset_reload_failures_total', 'Dataset files that failed to load or validate')
+# datasets are loaded by the gunicorn master, so the gauges report what it set last
+dataset_info = Gauge(
+    'api_dataset_info', 'Dataset version currently served (1), earlier ones (0)', ('version',),
+    multiprocess_mode='mostrecent')
+dataset_movies = Gauge(
+    'api_dataset_movies', 'Movies in the served dataset', multiprocess_mode='mostrecent')
+
+
+def multiprocess_dir():
+    return os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+
+
+def render():
+    """The metrics of every process sharing the multiprocess directory, or of this process without one"""
+    if multiprocess_dir():
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest(REGISTRY)
+
+
+def worker_exited(pid):
+    """Drops the live gauges of a finished worker (gunicorn child_exit); its counters stay in the totals"""
+    if multiprocess_dir():
+        multiprocess.mark_process_dead(pid)
+
+
+# set in the WSGI environ of cache warm-up requests, which are not client traffic
+WARM_UP_KEY = 'api.warm_up'
+
+
+def route_label():
+    rule = request.url_rule
+    return rule.rule if rule is not None else 'unmatched'
+
+
+@contextmanager
+def stage(name):
+    """Times a stage of the current request (compute, serialize, compress)"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        if has_request_context():
+            stages = g.setdefault('stages', {})
+            stages[name] = stages.get(name, 0.0) + time.perf_counter() - start
+
+
+def cache_result(hit):
+    if has_request_context():
+        g.cache_result = 'hit' if hit else 'miss'
+
+
+_served_version = None
+
+
+def dataset_loaded(snapshot, seconds, kind):
+    global _served_version
+    dataset_load_duration.labels(kind).observe(seconds)
+    if _served_version is not None and _served_version != snapshot.version:
+        dataset_info.labels(_served_version).set(0)
+    dataset_info.labels(snapshot.version).set(1)
+    _served_version = snapshot.version
+    dataset_movies.set(snapshot.store.size)
+
+
+def profiling_requested():
+    return request.headers.get('X-Profile', '').lower() in ('1', 'true')
+
+
+def server_timing(stages, total, cache):
+    """Formats a per-request breakdown as a Server-Timing header"""
+    parts = [f'{name};dur={seconds * 1000:.3f}' for name, seconds in stages.items()]
+    parts.append(f'total;dur={total * 1000:.3f}')
+    if cache:
+        parts.append(f'cache;desc={cache}')
+    return ', '.join(parts)
+
+
+def init_app(app):
+    """Instruments every request of app and serves the metrics at /metrics"""
+
+    @app.before_request
+    def start_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def record(resp):
+        started = g.get('request_started')
+        if started is None or request.environ.get(WARM_UP_KEY):
+            return resp
+        total = time.perf_counter() - started
+        route = route_label()
+        stages = g.get('stages', {})
+        cache = g.get('cache_result')
+
+        request_duration.labels(route, request.method, str(resp.status_code)).observe(total)
+        for name, seconds in stages.items():
+            stage_duration.labels(route, name).observe(seconds)
+        if cache:
+            cache_requests.labels(route, cache).inc()
+        if not resp.is_streamed and resp.content_length is not None:
+            response_bytes.labels(route).inc(resp.content_length)
+
+        if profiling_requested():
+            resp.headers['Server-Timing'] = server_timing(stages, total, cache)
+        return resp
+
+    @app.route('/metrics')
+    def metrics():
+        return Response(render(), content_type=CONTENT_TYPE_LATEST)
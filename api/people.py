@@ -0,0 +1,84 @@
+import heapq
+
+from indexes import normalize_token
+
+
+# role -> (store list column, key of the role in /api/trusted_people, default top-k)
+ROLES = {
+    'actor': ('actors', 'topActors', 10),
+    'director': ('directors', 'topDirectors', 7),
+    'writer': ('writers', 'topWriters', 10),
+    'producer': ('producers', 'topProducers', 10),
+    'composer': ('composers', 'topComposers', 10),
+    'operator': ('operators', 'topOperators', 10),
+}
+
+SORT_KEYS = ('count', 'rating')
+
+
+class PersonIndex:
+    """Film positions and rating sums of everyone credited in the dataset, per role.
+
+    Built once per dataset version; people keep the order in which they first
+    appear, so ties in a top-k break the same way as a stable sort.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        ratings = [0.0 if r != r else r for r in store.column('rating').tolist()]
+
+        self.roles = {}
+        for role, (column, _, _) in ROLES.items():
+            people = {}
+            for position, names in enumerate(store.lists[column]):
+                for name in names:
+                    entry = people.setdefault(name, {'positions': [], 'rating_sum': 0.0})
+                    entry['positions'].append(position)
+                    entry['rating_sum'] += ratings[position]
+            self.roles[role] = people
+
+        self.by_name = {}
+        for role, people in self.roles.items():
+            for name in people:
+                self.by_name.setdefault(normalize_token(name), name)
+
+    def describe(self, name, role):
+        entry = self.roles[role][name]
+        count = len(entry['positions'])
+        return {
+            'name': name,
+            'type': role,
+            'filmCount': count,
+            'averageRating': round(entry['rating_sum'] / count, 2) if count else 0,
+            'films': [self.store.titles[i] for i in entry['positions']]
+        }
+
+    def top(self, role, k, min_films=1, sort='count'):
+        """Returns the k people of a role with the most films (or best average rating)"""
+        def count(item):
+            return len(item[1]['positions'])
+
+        def average(item):
+            return (item[1]['rating_sum'] / count(item), count(item))
+
+        candidates = (item for item in self.roles[role].items() if count(item) >= min_films)
+        best = heapq.nlargest(k, candidates, key=average if sort == 'rating' else count)
+        return [self.describe(name, role) for name, _ in best]
+
+    def person(self, name):
+        """Returns every role of one person, looked up case- and ё-insensitively"""
+        canonical = self.by_name.get(normalize_token(name))
+        if canonical is None:
+            return None
+        return {
+            'name': canonical,
+            'roles': {
+                role: self.describe(canonical, role)
+                for role, people in self.roles.items() if canonical in people
+            }
+        }
+
+    def positions(self, role, name):
+        """Returns the film positions of a person in one role, empty when they have no credit in it"""
+        entry = self.roles[role].get(self.by_name.get(normalize_token(name)))
+        return entry['positions'] if entry else []
@@ -0,0 +1,180 @@
+import base64
+import json
+
+
+class QueryError(ValueError):
+    """Raised for malformed projection or pagination parameters"""
+
+
+def parse_paths(value):
+    """Parses a comma separated list of dotted field paths, e.g. "title,details.Рейтинг" """
+    if not value:
+        return ()
+    paths = set()
+    for item in value.split(','):
+        item = item.strip()
+        if not item:
+            continue
+        parts = tuple(p.strip() for p in item.split('.'))
+        if not all(parts):
+            raise QueryError(f"Invalid field path: {item}")
+        paths.add(parts)
+    return tuple(sorted(paths))
+
+
+def path_tree(paths):
+    """Turns dotted paths into a nested dict, True marks a whole subtree"""
+    tree = {}
+    for path in paths:
+        node = tree
+        for part in path[:-1]:
+            child = node.get(part)
+            if child is True:
+                break
+            node = node.setdefault(part, {})
+        else:
+            node[path[-1]] = True
+    return tree
+
+
+def pick(value, tree):
+    """Keeps only the fields of value listed in tree"""
+    result = {}
+    for key, sub in tree.items():
+        if key not in value:
+            continue
+        if sub is True or not isinstance(value[key], dict):
+            result[key] = value[key]
+        else:
+            result[key] = pick(value[key], sub)
+    return result
+
+
+def drop(value, tree):
+    """Removes the fields of value listed in tree, copying only the dicts it touches"""
+    result = dict(value)
+    for key, sub in tree.items():
+        if sub is True:
+            result.pop(key, None)
+        elif isinstance(result.get(key), dict):
+            result[key] = drop(result[key], sub)
+    return result
+
+
+def reaches(tree, path, whole=False):
+    """True when tree lists path or a field above it; unless whole, also when it lists only part of it"""
+    node = tree
+    for part in path:
+        node = node.get(part)
+        if node is None:
+            return False
+        if node is True:
+            return True
+    return not whole
+
+
+class Projection:
+    """A ?fields= / ?exclude= pair applied to every movie of a listing"""
+
+    def __init__(self, fields=(), exclude=()):
+        self.fields = fields
+        self.exclude = exclude
+        self._include_tree = path_tree(fields)
+        self._exclude_tree = path_tree(exclude)
+
+    @classmethod
+    def from_args(cls, args):
+        return cls(parse_paths(args.get('fields')), parse_paths(args.get('exclude')))
+
+    @property
+    def key(self):
+        return (self.fields, self.exclude)
+
+    def __bool__(self):
+        return bool(self.fields or self.exclude)
+
+    def selects(self, path):
+        """True when projected movies keep the field at path, e.g. ('details', 'Рейтинг')"""
+        if self._include_tree and not reaches(self._include_tree, path):
+            return False
+        return not (self._exclude_tree and reaches(self._exclude_tree, path, whole=True))
+
+    def apply(self, movie):
+        if self._include_tree:
+            movie = pick(movie, self._include_tree)
+        if self._exclude_tree:
+            movie = drop(movie, self._exclude_tree)
+        return movie
+
+
+def encode_cursor(version, offset):
+    raw = json.dumps({'v': version, 'o': offset}, separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor, version):
+    """Returns the offset stored in a cursor issued for the current dataset version"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        state = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        offset = int(state['o'])
+    except (ValueError, KeyError, TypeError):
+        raise QueryError("Invalid cursor")
+    if state.get('v') != version:
+        raise QueryError("Cursor belongs to a previous dataset version")
+    return offset
+
+
+def parse_int(args, name, default=None, minimum=0):
+    value = args.get(name)
+    if value is None or value == '':
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise QueryError(f"{name} must be an integer")
+    if number < minimum:
+        raise QueryError(f"{name} must be at least {minimum}")
+    return number
+
+
+class Page:
+    """limit/offset/cursor pagination over a listing of a known size"""
+
+    def __init__(self, offset=0, limit=None, paginated=False):
+        self.offset = offset
+        self.limit = limit
+        self.paginated = paginated
+
+    @classmethod
+    def from_args(cls, args, version):
+        limit = parse_int(args, 'limit', minimum=1)
+        offset = parse_int(args, 'offset', default=0)
+        cursor = args.get('cursor')
+        if cursor:
+            offset = decode_cursor(cursor, version)
+        return cls(offset, limit, paginated=bool(limit is not None or cursor or 'offset' in args))
+
+    @property
+    def key(self):
+        return (self.offset, self.limit) if self.paginated else None
+
+    def bounds(self, total):
+        start = min(self.offset, total)
+        stop = total if self.limit is None else min(start + self.limit, total)
+        return start, stop
+
+    def next_cursor(self, total, version):
+        _, stop = self.bounds(total)
+        return encode_cursor(version, stop) if stop < total else None
+
+    def envelope(self, items, total, version):
+        """Wraps one page of items with the information needed to fetch the next one"""
+        start, _ = self.bounds(total)
+        return {
+            'total': total,
+            'offset': start,
+            'limit': self.limit,
+            'next_cursor': self.next_cursor(total, version),
+            'movies': items,
+        }
@@ -0,0 +1,142 @@
+import numpy as np
+
+from histogram import parse_float
+from indexes import TokenIndex
+from projection import QueryError, parse_int
+
+
+# numeric column -> (lower bound parameter, upper bound parameter), both inclusive
+RANGE_FILTERS = {
+    'year': ('year_from', 'year_to'),
+    'rating': ('rating_from', 'rating_to'),
+    'runtime': ('runtime_from', 'runtime_to'),
+}
+
+# comma separated parameters; a movie matches when it has any of the listed values
+FACETS = ('genre', 'country', 'film_type', 'director', 'actor')
+
+# ?genre_mode=all requires every listed genre instead of any of them
+GENRE_MODES = ('any', 'all')
+
+
+def split_values(args, name):
+    return [v.strip() for v in args.get(name, '').split(',') if v.strip()]
+
+
+class SortedColumn:
+    """Positions of the movies ordered by a numeric column, for range lookups and sorting.
+
+    Movies without a value are kept apart; they never match a range and sort
+    last in both directions. Ties keep catalog order.
+    """
+
+    def __init__(self, column):
+        present = np.flatnonzero(~np.isnan(column)).astype(np.int32)
+        self.ascending = present[np.argsort(column[present], kind='stable')]
+        self.descending = present[np.argsort(-column[present], kind='stable')]
+        self.values = column[self.ascending]
+        self.missing = np.flatnonzero(np.isnan(column)).astype(np.int32)
+
+    def between(self, lo=None, hi=None):
+        """Returns the positions of movies with lo <= value <= hi by binary search"""
+        start = 0 if lo is None else np.searchsorted(self.values, lo, side='left')
+        stop = len(self.values) if hi is None else np.searchsorted(self.values, hi, side='right')
+        return self.ascending[start:stop]
+
+    def order(self, descending=False):
+        return np.concatenate([self.descending if descending else self.ascending, self.missing])
+
+
+class SearchQuery:
+    """The predicates and sort order of one /api/movies/search request"""
+
+    def __init__(self, ranges=(), facets=(), genre_mode='any', sort=None, descending=False):
+        self.ranges = tuple(ranges)
+        self.facets = tuple(facets)
+        self.genre_mode = genre_mode
+        self.sort = sort
+        self.descending = descending
+
+    @classmethod
+    def from_args(cls, args, store):
+        """Reads ?year_from=/?year_to=, ?rating_from=/?rating_to=, ?runtime_from=/?runtime_to=,
+        ?min_votes=, the facets, ?genre_mode= and ?sort= (a numeric column, -column for descending)"""
+        ranges = []
+        for column, (lo_name, hi_name) in RANGE_FILTERS.items():
+            lo = parse_float(args, lo_name)
+            hi = parse_float(args, hi_name)
+            if lo is not None and hi is not None and lo > hi:
+                raise QueryError(f"{lo_name} must not exceed {hi_name}")
+            if lo is not None or hi is not None:
+                ranges.append((column, lo, hi))
+        min_votes = parse_int(args, 'min_votes')
+        if min_votes is not None:
+            ranges.append(('votes', min_votes, None))
+
+        genre_mode = args.get('genre_mode', 'any')
+        if genre_mode not in GENRE_MODES:
+            raise QueryError(f"Unknown genre mode: {genre_mode}")
+
+        facets = [(name, tuple(split_values(args, name))) for name in FACETS if split_values(args, name)]
+
+        sort = args.get('sort', '')
+        descending = sort.startswith('-')
+        sort = sort.lstrip('-') or None
+        if sort is not None and sort not in store.columns:
+            raise QueryError(f"Unknown sort field: {sort}")
+
+        return cls(ranges, facets, genre_mode, sort, descending)
+
+    @property
+    def key(self):
+        return (self.ranges, self.facets, self.genre_mode, self.sort, self.descending)
+
+
+class SearchIndex:
+    """Evaluates multi-criteria searches without scanning the movies.
+
+    Ranges are binary searches over pre-sorted columns, facets come from
+    inverted indexes; each predicate becomes a bitmap of the catalog and the
+    bitmaps are ANDed together.
+    """
+
+    def __init__(self, store, lookup, people):
+        self.store = store
+        self.sorted = {name: SortedColumn(column) for name, column in store.columns.items()}
+        self.film_types = TokenIndex([[t] if t else [] for t in store.film_types])
+        self.postings = {
+            'genre': lookup.genres.exact,
+            'country': lookup.countries.exact,
+            'film_type': self.film_types.exact,
+            'director': lambda name: people.positions('director', name),
+            'actor': lambda name: people.positions('actor', name),
+        }
+
+    def bitmap(self, positions):
+        selected = np.zeros(self.store.size, dtype=bool)
+        selected[positions] = True
+        return selected
+
+    def predicates(self, query):
+        """Yields one bitmap per predicate of query"""
+        for column, lo, hi in query.ranges:
+            yield self.bitmap(self.sorted[column].between(lo, hi))
+        for name, values in query.facets:
+            bitmaps = [self.bitmap(self.postings[name](value)) for value in values]
+            if name == 'genre' and query.genre_mode == 'all':
+                yield np.logical_and.reduce(bitmaps)
+            else:
+                yield np.logical_or.reduce(bitmaps)
+
+    def search(self, query):
+        """Returns the positions of the movies matching every predicate of query, in its sort order"""
+        mask = None
+        for bitmap in self.predicates(query):
+            mask = bitmap if mask is None else mask & bitmap
+            if not mask.any():
+                return np.empty(0, dtype=np.int32)
+
+        if query.sort is None:
+            return np.arange(self.store.size) if mask is None else np.flatnonzero(mask)
+        order = self.sorted[query.sort].order(query.descending)
+        return order if mask is None else order[mask[order]]
@@ -0,0 +1,141 @@
+import numpy as np
+
+from store import parse_number
+
+
+GROUPINGS = ('genre', 'year', 'decade', 'film_type')
+
+# review score classes of preprocessing/tonality_analysis.complex_estimation, in its order
+DISTRIBUTION = ('strong_positive', 'weak_positive', 'neutral', 'weak_negative', 'strong_negative')
+
+# details keys of the scraped review counts, as used by the sentiment line charts
+REVIEW_COUNTS = {
+    'total': 'Количество рецензий от зрителей',
+    'positive': 'Количество положительных рецензий от зрителей',
+    'neutral': 'Количество нейтральных рецензий от зрителей',
+    'negative': 'Количество отрицательных рецензий от зрителей',
+}
+
+
+def score_classes(scores):
+    """Classifies review scores with the thresholds used by the preprocessing"""
+    return np.select(
+        [scores > 0.7, scores > 0.15, scores >= -0.15, scores >= -0.7],
+        [0, 1, 2, 3],
+        default=4
+    )
+
+
+def gather(offsets, movies):
+    """Indexes of the flattened scores of the given movies, one run per movie, without a Python loop"""
+    lengths = offsets[movies + 1] - offsets[movies]
+    run_starts = np.cumsum(lengths) - lengths
+    return np.repeat(offsets[movies] - run_starts, lengths) + np.arange(lengths.sum())
+
+
+class SentimentIndex:
+    """Review sentiment of every movie, flattened into arrays for grouped summaries.
+
+    All per-review scores live in one array with per-movie offsets, so a
+    grouping is a handful of bincount/lexsort calls however many reviews
+    there are.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        analyses = [(m.get('details') or {}).get('Анализ_рецензий') or {} for m in store.movies]
+
+        lists = [a.get('sentiments') or [] for a in analyses]
+        lengths = np.array([len(s) for s in lists], dtype=np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(lengths)])
+        self.scores = np.fromiter((s for scores in lists for s in scores), dtype=np.float32, count=int(lengths.sum()))
+        self.analysed = lengths > 0
+
+        self.movie_means = np.array([parse_number(a.get('mean_sentiment')) for a in analyses])
+        details = [m.get('details') or {} for m in store.movies]
+        self.review_counts = {
+            name: np.nan_to_num(np.array([parse_number(d.get(key)) for d in details]))
+            for name, key in REVIEW_COUNTS.items()
+        }
+
+        self.film_type_labels = sorted({t for t in store.film_types if t})
+        self.film_type_ids = np.array(
+            [self.film_type_labels.index(t) if t else -1 for t in store.film_types], dtype=np.int64)
+
+        genre_labels = sorted({g for genres in store.genres for g in genres})
+        genre_ids = {g: i for i, g in enumerate(genre_labels)}
+        pairs = [(position, genre_ids[g]) for position, genres in enumerate(store.genres) for g in dict.fromkeys(genres)]
+        self.genre_labels = genre_labels
+        self.genre_pairs = np.array(pairs, dtype=np.int64).reshape(-1, 2)
+
+    def memberships(self, by):
+        """Returns (movie positions, group ids, group labels); a movie with several genres is in several groups"""
+        if by == 'genre':
+            return self.genre_pairs[:, 0], self.genre_pairs[:, 1], self.genre_labels
+        if by == 'film_type':
+            movies = np.flatnonzero(self.film_type_ids >= 0)
+            return movies, self.film_type_ids[movies], self.film_type_labels
+
+        movies = np.flatnonzero(self.store.mask('year'))
+        years = self.store.column('year')[movies].astype(np.int64)
+        if by == 'decade':
+            years = years // 10 * 10
+        values, groups = np.unique(years, return_inverse=True)
+        labels = [f'{v}s' if by == 'decade' else str(v) for v in values]
+        return movies, groups, labels
+
+    def summary(self, by, mask):
+        """Per-group sentiment summary of the analysed movies selected by mask"""
+        movies, groups, labels = self.memberships(by)
+        keep = mask[movies] & self.analysed[movies]
+        movies, groups = movies[keep], groups[keep]
+        k = len(labels)
+
+        movie_count = np.bincount(groups, minlength=k)
+        movie_mean_sum = np.bincount(groups, weights=np.nan_to_num(self.movie_means[movies]), minlength=k)
+        typed = self.film_type_ids[movies] >= 0
+        types = len(self.film_type_labels)
+        film_types = np.bincount(
+            groups[typed] * types + self.film_type_ids[movies][typed], minlength=k * types).reshape(k, types)
+        counts = {name: np.bincount(groups, weights=c[movies], minlength=k) for name, c in self.review_counts.items()}
+
+        # every review score of every (movie, group) membership
+        reviews = gather(self.offsets, movies)
+        scores = self.scores[reviews].astype(np.float64)
+        review_groups = np.repeat(groups, self.offsets[movies + 1] - self.offsets[movies])
+
+        review_count = np.bincount(review_groups, minlength=k)
+        total = np.bincount(review_groups, weights=scores, minlength=k)
+        squares = np.bincount(review_groups, weights=scores * scores, minlength=k)
+        classes = np.bincount(review_groups * len(DISTRIBUTION) + score_classes(scores),
+                              minlength=k * len(DISTRIBUTION)).reshape(k, len(DISTRIBUTION))
+
+        # medians: sort scores within each group, then pick the middle one or two;
+        # the trailing sentinel keeps the indexes of empty groups in bounds
+        ordered = np.append(scores[np.lexsort((scores, review_groups))], 0.0)
+        starts = np.cumsum(review_count) - review_count
+        lower = ordered[starts + np.maximum(review_count - 1, 0) // 2]
+        upper = ordered[starts + review_count // 2]
+
+        result = []
+        for i in np.flatnonzero(movie_count):
+            n = review_count[i]
+            mean = total[i] / n
+            result.append({
+                'group': labels[i],
+                'movies': int(movie_count[i]),
+                'reviews': int(n),
+                'mean': round(float(mean), 4),
+                'median': round(float((lower[i] + upper[i]) / 2), 4),
+                'std': round(float(np.sqrt(max(squares[i] / n - mean * mean, 0.0))), 4),
+                'movie_mean': round(float(movie_mean_sum[i] / movie_count[i]), 4),
+                'distribution': {name: round(float(c / n), 4) for name, c in zip(DISTRIBUTION, classes[i])},
+                'film_types': {t: int(c) for t, c in zip(self.film_type_labels, film_types[i]) if c},
+                'review_shares': {
+                    name: round(float(counts[name][i] / counts['total'][i]), 4) if counts['total'][i] else None
+                    for name in ('positive', 'neutral', 'negative')
+                },
+            })
+        if by in ('genre', 'film_type'):
+            result.sort(key=lambda row: (-row['movies'], row['group']))
+        return {'by': by, 'groups': result}
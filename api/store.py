@@ -0,0 +1,113 @@
+import hashlib
+import json
+
+import numpy as np
+
+
+# column name -> (details key, parser); parsers mirror what the handlers used to do per request
+NUMERIC_COLUMNS = {
+    'year': ('Год производства', int),
+    'rating': ('Рейтинг', float),
+    'runtime': ('Время в минутах', int),
+    'budget': ('Бюджет $', float),
+    'gross_world': ('Сборы в мире $', float),
+    'gross_usa': ('Сборы в США $', float),
+    'gross_russia': ('Сборы в России $', float),
+    'audience': ('Зрители', float),
+    'votes': ('Количество оценок', int),
+    'rank': ('Топ 250', int),
+}
+
+LIST_COLUMNS = {
+    'genres': 'Жанр',
+    'countries': 'Страна',
+    'directors': 'Режиссер',
+    'actors': 'Актеры',
+    'writers': 'Сценарий',
+    'producers': 'Продюсер',
+    'composers': 'Композитор',
+    'operators': 'Оператор',
+}
+
+
+def parse_number(value, cast=float):
+    """Parses a raw details value, returns NaN when it is missing or malformed"""
+    if value is None:
+        return np.nan
+    try:
+        return float(cast(value))
+    except (TypeError, ValueError):
+        return np.nan
+
+
+def split_list(value):
+    """Splits a comma separated details value into stripped, non-empty items"""
+    if isinstance(value, list):
+        return [v.strip() for v in value if isinstance(v, str) and v.strip()]
+    if not isinstance(value, str):
+        return []
+    return [v.strip() for v in value.split(',') if v.strip()]
+
+
+class MovieStore:
+    """Columnar view of the movie list, parsed once when the dataset is loaded.
+
+    Numeric details live in float64 arrays (NaN where missing) with a boolean
+    mask per column; comma separated details are pre-split into lists.
+    """
+
+    def __init__(self, movies, version=None):
+        self.movies = movies
+        self.version = version
+        self.size = len(movies)
+        self.titles = [m.get('title') for m in movies]
+
+        details = [m.get('details') or {} for m in movies]
+
+        self.columns = {}
+        self.masks = {}
+        for name, (key, cast) in NUMERIC_COLUMNS.items():
+            column = np.array([parse_number(d.get(key), cast) for d in details], dtype=np.float64)
+            self.columns[name] = column
+            self.masks[name] = ~np.isnan(column)
+
+        self.lists = {name: [split_list(d.get(key)) for d in details] for name, key in LIST_COLUMNS.items()}
+
+        # 'Страна' as scraped, e.g. "США, Великобритания", used by the overall stats
+        self.country_labels = [d.get('Страна', '') for d in details]
+
+        # review reception class assigned by preprocessing/tonality_analysis.py, None when not analysed
+        self.film_types = [(d.get('Анализ_рецензий') or {}).get('film_type') for d in details]
+
+    @classmethod
+    def load(cls, path):
+        """Reads the dataset from a JSON file, versioned by a hash of its contents"""
+        with open(path, 'rb') as f:
+            raw = f.read()
+        return cls(json.loads(raw.decode('utf-8')), version=hashlib.sha1(raw).hexdigest()[:12])
+
+    def values(self, name):
+        """Returns the present values of a numeric column"""
+        return self.columns[name][self.masks[name]]
+
+    def column(self, name):
+        return self.columns[name]
+
+    def mask(self, name):
+        return self.masks[name]
+
+    @property
+    def genres(self):
+        return self.lists['genres']
+
+    @property
+    def countries(self):
+        return self.lists['countries']
+
+    @property
+    def directors(self):
+        return self.lists['directors']
+
+    @property
+    def actors(self):
+        return self.lists['actors']
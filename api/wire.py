@@ -0,0 +1,272 @@
+import numpy as np
+from flask import Response, request
+
+from cache import serialize
+from store import NUMERIC_COLUMNS
+
+try:
+    import msgpack
+except ImportError:  # without msgpack only JSON is offered
+    msgpack = None
+
+
+JSON = 'application/json'
+MSGPACK = 'application/x-msgpack'
+NDJSON = 'application/x-ndjson'
+
+FORMATS = {'json': JSON, 'msgpack': MSGPACK}
+
+
+class UnsupportedFormat(ValueError):
+    """Raised when the client explicitly asks for a format the server cannot produce"""
+
+
+def available_formats():
+    return [JSON, MSGPACK] if msgpack is not None else [JSON]
+
+
+def negotiate():
+    """Picks the response format from ?format= or the Accept header, JSON by default"""
+    requested = request.args.get('format')
+    if requested:
+        mimetype = FORMATS.get(requested)
+        if mimetype is None or mimetype not in available_formats():
+            raise UnsupportedFormat(f"Unsupported format: {requested}")
+        return mimetype
+
+    # ties (e.g. */*) go to JSON, the first offered format
+    return request.accept_mimetypes.best_match(available_formats(), default=JSON)
+
+
+def wants_stream():
+    """True when a listing should be streamed as NDJSON (?stream=1 or Accept: application/x-ndjson)"""
+    if request.args.get('stream') in ('1', 'true'):
+        return True
+    return request.accept_mimetypes.best_match([JSON, NDJSON], default=JSON) == NDJSON
+
+
+def stream_movies(movies, positions, projection):
+    """Streams one (projected) movie per line; nothing but the current line is held in memory"""
+    def lines():
+        for i in positions:
+            yield serialize(projection.apply(movies[i])) + b'\n'
+
+    return Response(lines(), mimetype=NDJSON)
+
+
+# how a column value is turned back into the details value it was parsed from
+KINDS = {'str': str, 'int': int, 'float': float}
+
+
+# narrowest first; a column takes the first that holds all its (scaled) values
+INT_DTYPES = ['<u1', '<i1', '<u2', '<i2', '<u4', '<i4', '<i8']
+SCALES = (1, 10, 100, 1000)
+# a column whose typical value ends in this many zeros (budgets, audiences) sends them as decimal exponents
+ROUND_ZEROS = 3
+
+
+def trailing_zeros(numbers):
+    """Splits integers into mantissas without trailing decimal zeros and the count of those zeros"""
+    mantissas = numbers.copy()
+    exponents = np.zeros(len(numbers), dtype=np.uint8)
+    while True:
+        round_ = (mantissas % 10 == 0) & (mantissas != 0)
+        if not round_.any():
+            return mantissas, exponents
+        mantissas[round_] //= 10
+        exponents[round_] += 1
+
+
+def shuffle(values, dtype):
+    """The bytes of values in dtype, grouped by byte position so they compress well"""
+    values = np.ascontiguousarray(values, dtype=dtype)
+    return values.view(np.uint8).reshape(-1, values.itemsize).T.tobytes()
+
+
+def unshuffle(data, dtype, length):
+    size = np.dtype(dtype).itemsize
+    planes = np.frombuffer(data, dtype=np.uint8, count=size * length).reshape(size, length)
+    return np.ascontiguousarray(planes.T).view(dtype).ravel()
+
+
+def typed_array(values):
+    """Packs a numeric column as little-endian integers or float64, whichever is the smallest exact encoding.
+
+    Values that are all multiples of 1/scale (e.g. ratings like 8.8, scale
+    10) travel as the narrowest integer type holding value * scale, mostly
+    round ones as mantissas plus one byte of decimal exponent each; a
+    bitmap marks the present values when some are missing. Anything else
+    is float64 with NaN for missing values. The bytes are shuffled (see
+    shuffle) either way.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    present = ~np.isnan(values)
+    known = values[present]
+    column = {'dtype': '<f8', 'length': len(values), 'scale': 1}
+    data = values
+    for scale in SCALES:
+        scaled = np.round(known * scale)
+        # integers up to 2 ** 53 survive the way back through float64 exactly
+        if np.abs(scaled).max(initial=0) < 2 ** 53 and np.array_equal(scaled / scale, known):
+            data = np.zeros(len(values), dtype=np.int64)
+            data[present] = scaled
+            mantissas, exponents = trailing_zeros(data)
+            if len(known) and np.median(exponents[present]) >= ROUND_ZEROS:
+                data = mantissas
+                column['exponents'] = exponents.tobytes()
+            column['dtype'] = next(t for t in INT_DTYPES if np.iinfo(t).min <= data.min(initial=0)
+                                   and data.max(initial=0) <= np.iinfo(t).max)
+            column['scale'] = scale
+            break
+    if column['dtype'] != '<f8' and not present.all():
+        column['present'] = np.packbits(present).tobytes()
+    column['data'] = shuffle(data, column['dtype'])
+    return column
+
+
+def read_typed_array(column):
+    """Inverse of typed_array as float64 with NaN for missing values, used by Python clients and the format comparison"""
+    values = unshuffle(column['data'], column['dtype'], column['length']).astype(np.float64)
+    if 'exponents' in column:
+        values *= 10.0 ** np.frombuffer(column['exponents'], dtype=np.uint8)
+    if column['scale'] != 1:
+        values /= column['scale']
+    if 'present' in column:
+        present = np.unpackbits(np.frombuffer(column['present'], dtype=np.uint8), count=column['length'])
+        values[present == 0] = np.nan
+    return values
+
+
+def column_value(number, kind, scale=1):
+    """The details value a column number stands for: '112' for 112.0 as 'str', 112 as 'int'.
+
+    Strings of a scaled column keep its decimals, e.g. '8.0' in a column of scale 10.
+    """
+    if kind == 'str':
+        if scale > 1:
+            return f"{number:.{len(str(scale)) - 1}f}"
+        return str(int(number)) if number.is_integer() else repr(number)
+    return int(number) if kind == 'int' else number
+
+
+def column_kind(values, numbers):
+    """The most common type of the details values behind a column"""
+    counts = dict.fromkeys(KINDS, 0)
+    for value, number in zip(values, numbers):
+        kind = type(value).__name__
+        if kind in counts and number == number:
+            counts[kind] += 1
+    return max(counts, key=counts.get)
+
+
+# separates the values of a text column; strings containing it stay in their records
+TEXT_SEPARATOR = '\x00'
+
+
+def text_fields(records):
+    """Paths of the top-level and details fields holding a string in some record, in order of appearance"""
+    fields = {}
+    for record in records:
+        for key, value in record.items():
+            if isinstance(value, str):
+                fields[(key,)] = None
+        details = record.get('details')
+        if isinstance(details, dict):
+            for key, value in details.items():
+                if isinstance(value, str):
+                    fields[('details', key)] = None
+    return list(fields)
+
+
+def field_parent(record, path):
+    """The dict holding the field at path, None when the record has no such dict"""
+    parent = record if len(path) == 1 else record.get(path[0])
+    return parent if isinstance(parent, dict) else None
+
+
+def text_column(records, path):
+    """Moves the strings at path out of records into one text column"""
+    present = np.zeros(len(records), dtype=bool)
+    texts = []
+    for i, record in enumerate(records):
+        parent = field_parent(record, path)
+        value = parent.get(path[-1]) if parent is not None else None
+        if isinstance(value, str) and TEXT_SEPARATOR not in value:
+            present[i] = True
+            texts.append(value)
+            del parent[path[-1]]
+    column = {'field': list(path), 'data': TEXT_SEPARATOR.join(texts)}
+    if not present.all():
+        column['present'] = np.packbits(present).tobytes()
+    return column
+
+
+def columnar_movies(store, start, stop, records, projection=None):
+    """Columnar body for a slice of the movie list.
+
+    Every parsed numeric column of the store whose details field the
+    projection keeps travels as one typed array, and every string field as
+    one text column (its strings joined by TEXT_SEPARATOR, with a bitmap of
+    the records having one unless all do). What the columns carry is left out of the
+    (projected) records, which follow as ordinary MessagePack maps, so
+    nothing is sent twice. Numbers a column cannot reproduce exactly (see
+    column_value) stay in the records, e.g. '007'. read_columnar puts
+    everything back.
+    """
+    names = [name for name, (key, _) in NUMERIC_COLUMNS.items()
+             if projection is None or projection.selects(('details', key))]
+    # copies, the records may be the store's own movies
+    records = [dict(r, details=dict(r['details'])) if isinstance(r.get('details'), dict) else dict(r)
+               for r in records]
+    columns = {}
+    for name in names:
+        key, _ = NUMERIC_COLUMNS[name]
+        numbers = store.columns[name][start:stop]
+        details = [record.get('details') or {} for record in records]
+        kind = column_kind([d.get(key) for d in details], numbers.tolist())
+        column = dict(typed_array(numbers), field=key, kind=kind)
+        for d, number in zip(details, numbers.tolist()):
+            value = d.get(key)
+            if number == number and type(value) is KINDS[kind] and column_value(number, kind, column['scale']) == value:
+                del d[key]
+        columns[name] = column
+    texts = [text_column(records, path) for path in text_fields(records)]
+    return {
+        'format': 'columnar-v2',
+        'version': store.version,
+        'count': stop - start,
+        'offset': start,
+        'columns': columns,
+        'texts': texts,
+        'records': records,
+    }
+
+
+def read_columnar(data):
+    """The records of a columnar body with the values its columns carry put back"""
+    records = data['records']
+    # text first: a number kept in a record as text, e.g. '007', must not be rebuilt from its column
+    for column in data['texts']:
+        path = column['field']
+        having = records
+        if 'present' in column:
+            present = np.unpackbits(np.frombuffer(column['present'], dtype=np.uint8), count=len(records))
+            having = [record for record, has in zip(records, present) if has]
+        texts = column['data'].split(TEXT_SEPARATOR)
+        for record, text in zip(having, texts):
+            field_parent(record, path)[path[-1]] = text
+    for column in data['columns'].values():
+        key, kind = column['field'], column['kind']
+        for record, number in zip(records, read_typed_array(column).tolist()):
+            details = record.get('details')
+            if number == number and isinstance(details, dict) and key not in details:
+                details[key] = column_value(number, kind, column['scale'])
+    return records
+
+
+def pack(data):
+    return msgpack.packb(data, use_bin_type=True)
+
+
+def unpack(body):
+    return msgpack.unpackb(body, raw=False)
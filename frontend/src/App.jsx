@@ -290,7 +290,7 @@ function App() {
             and where <span className="text-blue"> disappointment prevails</span>
           </div>  
         </div>
-        {movies && <GenreSentimentLineChart movies={movies} />}
+        <GenreSentimentLineChart />
         <p className="years-description" style={{ marginBottom: '10%' }}>
         In addition to information about the tone of the reviews, we decided to evaluate its <span className="text-blue">approximate numeric value</span> for each film 
         with a value from -1 to 1, where -1 is the strongest negative emotion, and 1 is the strongest positive emotion, 
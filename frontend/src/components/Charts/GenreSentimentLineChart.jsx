@@ -1,4 +1,4 @@
-import React, { useMemo } from "react";
+import React, { useEffect, useState } from "react";
 import {
   Chart as ChartJS,
   LineElement,
@@ -21,41 +21,28 @@ ChartJS.register(
   Filler
 );
 
-export default function GenreSentimentLineChart({ movies }) {
-  const genreStats = useMemo(() => {
-    const genreMap = {};
+export default function GenreSentimentLineChart() {
+  const [genreStats, setGenreStats] = useState([]);
 
-    movies.forEach(movie => {
-      const genres = movie.details["Жанр"]?.split(",").map(g => g.trim()) || [];
-      const total = +movie.details["Количество рецензий от зрителей"];
-      const pos = +movie.details["Количество положительных рецензий от зрителей"];
-      const neu = +movie.details["Количество нейтральных рецензий от зрителей"];
-      const neg = +movie.details["Количество отрицательных рецензий от зрителей"];
-
-      if (!total || isNaN(total)) return;
-
-      genres.forEach(genre => {
-        if (!genreMap[genre]) {
-          genreMap[genre] = { total: 0, pos: 0, neu: 0, neg: 0, count: 0 };
-        }
-
-        genreMap[genre].total += total;
-        genreMap[genre].pos += pos;
-        genreMap[genre].neu += neu;
-        genreMap[genre].neg += neg;
-        genreMap[genre].count += 1;
-      });
-    });
+  useEffect(() => {
+    const fetchData = async () => {
+      try {
+        const response = await fetch(`${import.meta.env.VITE_API_URL}/api/analytics/sentiment?by=genre`);
+        if (!response.ok) throw new Error(`Sentiment request failed: ${response.status}`);
+        const data = await response.json();
+        setGenreStats(
+          data.groups
+            .filter(g => g.review_shares.positive !== null)
+            .map(g => ({ genre: g.group, ...g.review_shares }))
+            .sort((a, b) => a.genre.localeCompare(b.genre))
+        );
+      } catch (error) {
+        console.error('Error loading sentiment data:', error);
+      }
+    };
 
-    return Object.entries(genreMap)
-      .map(([genre, stats]) => ({
-        genre,
-        positive: stats.pos / stats.total,
-        neutral: stats.neu / stats.total,
-        negative: stats.neg / stats.total
-      }))
-      .sort((a, b) => a.genre.localeCompare(b.genre));
-  }, [movies]);
+    fetchData();
+  }, []);
 
   const labels = genreStats.map(g => g.genre);
 
@@ -24,18 +24,12 @@ const ExplorationSection = () => {
 
   const loadData = async () => {
     try {
-      const responses = await Promise.all([
-        fetch(`${import.meta.env.VITE_API_URL}/api/charts/years`),
-        fetch(`${import.meta.env.VITE_API_URL}/api/charts/boxoffice`),
-        fetch(`${import.meta.env.VITE_API_URL}/api/charts/ratings`),
-        fetch(`${import.meta.env.VITE_API_URL}/api/charts/genres`)
-      ]);
-      
-      const [years, boxOffice, ratings, genres] = await Promise.all(
-        responses.map(res => res.json())
+      const response = await fetch(
+        `${import.meta.env.VITE_API_URL}/api/charts/bundle?include=years,boxoffice,ratings,genres`
       );
+      const { years, boxoffice, ratings, genres } = await response.json();
 
-      setChartData({ years, boxOffice, ratings, genres });
+      setChartData({ years, boxOffice: boxoffice, ratings, genres });
     } catch (error) {
       console.error('Error loading chart data:', error);
     }
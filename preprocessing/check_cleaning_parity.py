@@ -0,0 +1,318 @@
+"""Checks that cleaning.clean_details reproduces the original row-by-row cleaning.
+
+Runs the original implementation (kept below verbatim, except that budgets
+go through the offline conversion of exchange.py) and the column
+engine on the same scraped file, and again with missing or invalid values
+mixed into every column, compares the serialized results movie by movie
+and prints both timings. Exits with status 1 on the first mismatch.
+
+Usage: python check_cleaning_parity.py [../data/movies_final.json]
+"""
+import json
+import re
+import sys
+import time
+
+import pandas as pd
+
+import exchange
+from main import clean_dataframe, load_and_process_data
+
+
+def clean_dataframe_rowwise(df):
+    """Original cleaning, one row and one key at a time."""
+
+    def process_details(details):
+        """Process details dictionary without modifying during iteration"""
+        keys_to_process = list(details.keys())  # Create static list of keys
+        modified = {}
+
+        for key in keys_to_process:
+            value = details[key]
+            if isinstance(value, str):
+                value = clean_text(value)
+
+            if key == "Сборы в мире":
+                modified["Сборы в мире $"] = extract_last_revenue(value)
+            elif key == "Сборы в США":
+                modified["Сборы в США $"] = clean_revenue(value)
+            elif key == "Сборы в России":
+                modified["Сборы в России $"] = clean_revenue(value)
+            elif key == "Бюджет":
+                value_usd = convert_to_usd(value)
+                if value_usd:
+                    modified["Бюджет $"] = value_usd
+                else:
+                    modified["Бюджет $"] = value
+
+            elif key == "Зрители":
+                    viewers = process_viewers(value)
+                    if viewers is not None:
+                        modified["Зрители"] = viewers
+                    else:
+                        modified["Зрители"] = value
+
+            elif key == "Рецензии 100 зрителей":
+                modified[key] = clean_reviews(value)
+            elif key == "Актеры":
+                modified[key] = clean_list(value)
+            elif key == "Маркетинг":
+                modified[key] = clean_revenue(value)
+            elif key in ["Премьера в России", "Премьера в мире", "Релиз на DVD", "Релиз на Blu-ray", "Ре-релиз (РФ)"]:
+                modified[key] = format_date(extract_date(value))
+            elif key == "Время":
+                minutes = convert_to_minutes(value)
+                if minutes is not None:
+                    modified["Время в минутах"] = str(minutes)
+                else:
+                    modified["Время в минутах"] = value
+            elif key == "Топ 250":
+                modified[key] = clean_revenue(value).replace("место", "")
+
+            elif key == "Оценок":
+                number = extract_number(value)
+                if number is not None:
+                    modified["Количество оценок"] = str(number)
+                else:
+                    modified["Количество оценок"] = None
+            elif isinstance(value, str):
+                modified[key] = clean_text(value)
+            elif isinstance(value, list):
+                modified[key] = clean_list(value)
+            else:
+                modified[key] = clean_numeric(value)
+
+        return modified
+
+    def clean_text(text):
+        """Removes whitespace, extra spaces, trailing ellipsis (...), and trailing comma with optional space."""
+        if isinstance(text, str):
+            cleaned_text = " ".join(text.strip().split())
+            cleaned_text = re.sub(r"[,]\s*$", "", cleaned_text)
+            cleaned_text = cleaned_text.replace("...", "")
+            return cleaned_text
+        return text
+
+    def clean_list(data_list):
+        """Cleans whitespace from items in list and removes empty strings."""
+        if isinstance(data_list, list):
+            return [clean_text(item) for item in data_list if isinstance(item, str) and clean_text(item)]
+        return data_list
+
+    def clean_numeric(value):
+        """Converts to numeric, removing extra characters."""
+        if isinstance(value, str):
+            value = value.replace('$', '').replace(',', '')
+        try:
+            return pd.to_numeric(value, errors='coerce')
+        except:
+            return value
+
+    def extract_last_revenue(revenue_string):
+        """Extracts the last revenue number from a string and formats it."""
+        if isinstance(revenue_string, str):
+            match = re.search(r"= ([$][\d\s]+)", revenue_string)
+            if match:
+                revenue_number = match.group(1)
+            else:
+                match = re.search(r"[$][\d\s]+", revenue_string)
+                if match:
+                    revenue_number = match.group(0)
+                else:
+                    return None
+
+            revenue_number = revenue_number.replace(" ", "")
+
+            if revenue_number.startswith("$"):
+                revenue_number = revenue_number[1:]
+
+            return revenue_number
+
+        return None
+
+    def clean_revenue(revenue_string):
+        """Removes spaces and the first dollar sign from a revenue string."""
+        if isinstance(revenue_string, str):
+            revenue_string = revenue_string.replace(" ", "")
+            if revenue_string.startswith("$"):
+                revenue_string = revenue_string[1:]
+            return revenue_string
+        return revenue_string
+
+    def extract_number(ratings_string):
+        """Extracts the number from the string and returns it as an integer."""
+        if isinstance(ratings_string, str):
+            number_str = re.sub(r"[^\d]", "", ratings_string)
+
+            try:
+                return int(number_str)
+            except ValueError:
+                return None
+        return None
+
+    def format_number(number):
+        """Formats a number with spaces for better readability."""
+        if isinstance(number, (int, float)):
+            return re.sub(r"(\d)(?=(\d{3})+(?!\d))", r"\1 ", str(int(number)))
+        return number
+
+    def convert_to_usd(value):
+        """Budgets are converted offline now, the same way in both implementations."""
+        if isinstance(value, str):
+            return exchange.convert_to_usd(value)
+        return value
+
+    def process_viewers(viewers_string):
+        """Converts viewers string to full number."""
+        if isinstance(viewers_string, str):
+            viewers_string = viewers_string.replace(" ", "")
+            if "тыс" in viewers_string:
+                number_str = viewers_string.replace("тыс", "")
+                try:
+                    number = float(number_str) * 1000
+                    return int(number)
+                except ValueError:
+                    return None
+            elif "млн" in viewers_string:
+                number_str = viewers_string.replace("млн", "")
+                try:
+                    number = float(number_str) * 1000000
+                    return int(number)
+                except ValueError:
+                    return None
+            else:
+                try:
+                    return int(float(viewers_string))
+                except ValueError:
+                    return None
+        return None
+
+    def clean_reviews(reviews):
+        """Clean and remove duplicates from reviews."""
+        if isinstance(reviews, list):
+            cleaned_reviews = []
+            seen = set()
+            for review in reviews:
+                cleaned_review = clean_text(review)
+                if cleaned_review and cleaned_review not in seen:
+                    cleaned_reviews.append(cleaned_review)
+                    seen.add(cleaned_review)
+            return cleaned_reviews
+        return reviews
+
+    def extract_date(date_string):
+        """Extracts the date, month, and year from the string and returns them as integers."""
+        if isinstance(date_string, str):
+            try:
+                parts = date_string.split(',')
+                date_part = parts[0].strip()
+
+                date_parts = date_part.split()
+                if len(date_parts) >= 3:
+                    day = int(date_parts[0])
+                    month_str = date_parts[1]
+                    year = int(date_parts[2])
+
+                    month_dict = {
+                        "января": 1, "февраля": 2, "марта": 3, "апреля": 4,
+                        "мая": 5, "июня": 6, "июля": 7, "августа": 8,
+                        "сентября": 9, "октября": 10, "ноября": 11, "декабря": 12
+                    }
+                    month = month_dict.get(month_str.lower())
+
+                    return {"day": day, "month": month, "year": year}
+                else:
+                    return None
+            except ValueError:
+                return None
+        return None
+
+    def format_date(date_dict):
+        """Formats the date dictionary to DD.MM.YYYY format."""
+        if isinstance(date_dict, dict) and "day" in date_dict and "month" in date_dict and "year" in date_dict:
+            day = date_dict["day"]
+            month = date_dict["month"]
+            year = date_dict["year"]
+            return f"{day:02d}.{month:02d}.{year}"
+        return None
+
+    def convert_to_minutes(time_string):
+        """Converts time string (e.g., "1 ч 52 мин") to total minutes."""
+        if isinstance(time_string, str):
+            match = re.match(r"(\d+)\s*ч\s*(\d+)\s*мин", time_string)
+            if match:
+                hours = int(match.group(1))
+                minutes = int(match.group(2))
+                total_minutes = hours * 60 + minutes
+                return total_minutes
+        return None
+
+    for index, row in df.iterrows():
+        details = row['details'].copy()
+        cleaned_details = process_details(details)
+        df.at[index, 'details'] = cleaned_details
+
+    return df
+
+
+def serialized(df):
+    return [json.dumps(row, ensure_ascii=False) for row in df.where(pd.notnull(df), None).to_dict(orient='records')]
+
+
+# what partially scraped pages hold instead of a value; the original
+# cleaning fails on anything but a string in "Топ 250", so it keeps its own
+MISSING_VALUES = [None, '', 'нет данных', '—', 0, 3.5]
+
+
+def with_missing_values(df):
+    """Copy of df where every third movie has a missing or invalid value under each key, mixed with the real ones"""
+    df = df.copy()
+    details = []
+    for position, movie_details in enumerate(df['details']):
+        movie_details = dict(movie_details)
+        if position % 3 == 1:
+            for i, key in enumerate(movie_details):
+                if key != "Топ 250":
+                    movie_details[key] = MISSING_VALUES[(position + i) % len(MISSING_VALUES)]
+        details.append(movie_details)
+    df['details'] = details
+    return df
+
+
+def compare(label, rowwise, columnar):
+    """Returns True when both implementations clean the same movies identically"""
+    started = time.perf_counter()
+    expected = serialized(clean_dataframe_rowwise(rowwise))
+    rowwise_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    actual = serialized(clean_dataframe(columnar))
+    columnar_time = time.perf_counter() - started
+
+    print(f"{label}: {len(expected)} movies, row-wise {rowwise_time:.2f}s, columnar {columnar_time:.2f}s")
+    for position, (old, new) in enumerate(zip(expected, actual)):
+        if old != new:
+            old_details, new_details = json.loads(old)['details'], json.loads(new)['details']
+            keys = [k for k in dict.fromkeys([*old_details, *new_details]) if old_details.get(k) != new_details.get(k)]
+            print(f"Movie #{position} differs in {keys or 'key order'}")
+            for key in keys[:5]:
+                print(f"  {key}: {old_details.get(key)!r} != {new_details.get(key)!r}")
+            return False
+    if len(expected) != len(actual):
+        print(f"Different number of movies: {len(expected)} != {len(actual)}")
+        return False
+    print("Identical output")
+    return True
+
+
+def check_parity(input_file):
+    """Returns True when both implementations clean input_file, and input_file with missing values, identically"""
+    if not compare(input_file, load_and_process_data(input_file), load_and_process_data(input_file)):
+        return False
+    movies = load_and_process_data(input_file)
+    return compare("with missing values", with_missing_values(movies), with_missing_values(movies))
+
+
+if __name__ == "__main__":
+    if not check_parity(sys.argv[1] if len(sys.argv) > 1 else "../data/movies_final.json"):
+        sys.exit(1)
@@ -0,0 +1,311 @@
+"""Column-oriented cleaning of the scraped movie details.
+
+The details dicts are flattened into one column per key, each column is
+cleaned with vectorized pandas string operations (once per distinct
+string, as scraped values repeat a lot), and the rows are reassembled in
+their original key order. CLEANERS maps a scraped key to
+the key it is saved under and the cleaner of its column.
+"""
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+import numpy as np
+import pandas as pd
+
+from exchange import convert_column, release_year
+
+
+MONTHS = {
+    "января": 1, "февраля": 2, "марта": 3, "апреля": 4,
+    "мая": 5, "июня": 6, "июля": 7, "августа": 8,
+    "сентября": 9, "октября": 10, "ноября": 11, "декабря": 12
+}
+
+INTEGER = r'^[+-]?\d+$'
+
+
+def is_instance(series, kind):
+    return pd.Series(np.fromiter(map(kind.__instancecheck__, series), dtype=bool, count=len(series)),
+                     index=series.index)
+
+
+def nones(values):
+    return pd.Series([None] * len(values), index=values.index, dtype=object)
+
+
+def assign(target, where, values):
+    """Returns a copy of the object Series target with values (in order) at where, a mask or index labels.
+
+    Written through a NumPy object array: Series assignment turns None into
+    NaN on pandas 3, and ints into floats next to floats.
+    """
+    result = target.to_numpy(dtype=object, copy=True)
+    if isinstance(where, pd.Index):
+        where = target.index.get_indexer(where)
+    else:
+        where = np.asarray(where, dtype=bool)
+    result[where] = pd.Series(values, dtype=object).to_numpy(dtype=object)
+    return pd.Series(result, index=target.index, dtype=object)
+
+
+def per_unique(clean, texts):
+    """Applies a column cleaner to each distinct string once; scraped columns repeat a lot"""
+    codes, uniques = pd.factorize(texts)
+    cleaned = clean(pd.Series(uniques, dtype=object))
+    return pd.Series(cleaned.to_numpy()[codes], index=texts.index, dtype=object)
+
+
+def clean_text(texts):
+    """Collapses whitespace, drops a trailing comma and every '...'"""
+    return per_unique(lambda unique: (
+        unique.str.replace(r'\s+', ' ', regex=True).str.strip()
+        .str.replace(r',\s*$', '', regex=True)
+        .str.replace('...', '', regex=False)), texts)
+
+
+def clean_revenue(texts):
+    """Removes spaces and the first dollar sign"""
+    return texts.str.replace(' ', '', regex=False).str.replace(r'^\$', '', regex=True)
+
+
+def clean_numeric(value):
+    """Converts a non-string value to a number, leaving what cannot be converted as is"""
+    try:
+        return pd.to_numeric(value, errors='coerce')
+    except Exception:
+        return value
+
+
+# Column cleaners. Each gets the column (strings already through clean_text)
+# and a mask of its string values, and returns the cleaned column.
+
+def last_revenue_column(values, is_str):
+    """Keeps the total after '=' (or the first $ amount) of a revenue breakdown, without spaces and $"""
+    texts = values[is_str]
+    total = texts.str.extract(r'= ([$][\d\s]+)', expand=False)
+    amount = total.where(total.notna(), texts.str.extract(r'([$][\d\s]+)', expand=False))
+    result = nones(values)
+    found = amount.notna()
+    result = assign(result, found[found].index, amount[found].str.replace(' ', '', regex=False).str[1:])
+    return result
+
+
+def revenue_column(values, is_str):
+    values = assign(values, is_str, clean_revenue(values[is_str]))
+    return values
+
+
+def top250_column(values, is_str):
+    values = assign(values, is_str, clean_revenue(values[is_str]).str.replace('место', '', regex=False))
+    return values
+
+
+def budget_column(values, is_str, years=None):
+    """Converts budgets to USD, at the rates of their production years when given; unconvertible ones are kept"""
+    texts = values[is_str]
+    if years is not None:
+        years = [years[i] for i in np.flatnonzero(is_str)]
+    converted = convert_column(texts.tolist(), years)
+    values = assign(values, is_str, [usd or text for usd, text in zip(converted, texts)])
+    return values
+
+
+def viewers_column(values, is_str):
+    """Expands '19.4 млн' / '250 тыс' audience figures to integers, keeps what does not parse"""
+    texts = values[is_str].str.replace(' ', '', regex=False)
+    thousands = texts.str.contains('тыс', regex=False)
+    millions = ~thousands & texts.str.contains('млн', regex=False)
+    numbers = texts.where(~thousands, texts.str.replace('тыс', '', regex=False))
+    numbers = numbers.where(~millions, texts.str.replace('млн', '', regex=False))
+    parsed = pd.to_numeric(numbers, errors='coerce').astype(np.float64)
+    parsed = parsed * np.where(thousands, 1000, np.where(millions, 1000000, 1))
+    ok = np.isfinite(parsed)
+    values = assign(values, ok[ok].index, np.trunc(parsed[ok]).astype(np.int64))
+    return values
+
+
+def minutes_column(values, is_str):
+    """Turns '1 ч 52 мин' into '112', keeps other values"""
+    parts = values[is_str].str.extract(r'^(\d+)\s*ч\s*(\d+)\s*мин')
+    ok = parts[0].notna()
+    hours = parts.loc[ok, 0].astype(np.int64)
+    minutes = parts.loc[ok, 1].astype(np.int64)
+    values = assign(values, ok[ok].index, (hours * 60 + minutes).astype(str))
+    return values
+
+
+def votes_column(values, is_str):
+    """Keeps the digits of a vote count, None when there are none"""
+    result = nones(values)
+    digits = values[is_str].str.replace(r'[^\d]', '', regex=True)
+    ok = digits != ''
+    result = assign(result, ok[ok].index, digits[ok].str.lstrip('0').replace('', '0'))
+    return result
+
+
+def date_column(values, is_str):
+    """Formats '23 сентября 2011, ...' as '23.09.2011', None when it is not such a date"""
+    result = nones(values)
+    date_part = values[is_str].str.split(',', n=1).str[0]
+    parts = date_part.str.extract(r'^\s*(\S+)\s+(\S+)\s+(\S+)')
+    month = parts[1].str.lower().map(MONTHS)
+    ok = (parts[0].str.match(INTEGER) & parts[2].str.match(INTEGER)).fillna(False).astype(bool) & month.notna()
+    day = parts.loc[ok, 0].astype(np.int64).astype(str).str.zfill(2)
+    year = parts.loc[ok, 2].astype(np.int64).astype(str)
+    month = month[ok].astype(np.int64).astype(str).str.zfill(2)
+    result = assign(result, ok[ok].index, day + '.' + month + '.' + year)
+    return result
+
+
+def clean_lists(lists, dedupe=False):
+    """Cleans the string items of every list; drops empty items, non-strings (unless dedupe) and repeats (with dedupe)"""
+    if not lists:
+        return []
+    owners = np.repeat(np.arange(len(lists)), [len(items) for items in lists])
+    items = pd.Series([item for items in lists for item in items], dtype=object)
+    is_str = is_instance(items, str)
+    items = assign(items, is_str, clean_text(items[is_str]))
+    if dedupe:
+        keep = items.map(bool).astype(bool)
+        keep &= ~pd.DataFrame({'owner': owners, 'item': items}).duplicated().to_numpy()
+    else:
+        keep = is_str & (items != '')
+    counts = np.bincount(owners[keep.to_numpy()], minlength=len(lists))
+    return [part.tolist() for part in np.split(items[keep].to_numpy(), np.cumsum(counts)[:-1])]
+
+
+def list_column(values, is_str, dedupe=False):
+    is_list = is_instance(values, list)
+    values = assign(values, is_list, clean_lists(values[is_list].tolist(), dedupe))
+    return values
+
+
+def reviews_column(values, is_str):
+    return list_column(values, is_str, dedupe=True)
+
+
+def other_column(values, is_str):
+    """Keys without a dedicated cleaner: text is cleaned once more, lists item-wise, the rest made numeric"""
+    values = assign(values, is_str, clean_text(values[is_str]))
+    values = list_column(values, is_str)
+    other = ~is_str & ~is_instance(values, list)
+    # an object array, so ints next to floats or None are not turned into floats
+    values = assign(values, other, [clean_numeric(value) for value in values[other]])
+    return values
+
+
+DATE_KEYS = ("Премьера в России", "Премьера в мире", "Релиз на DVD", "Релиз на Blu-ray", "Ре-релиз (РФ)")
+
+# scraped key -> (key in the cleaned data, column cleaner)
+CLEANERS = {
+    "Сборы в мире": ("Сборы в мире $", last_revenue_column),
+    "Сборы в США": ("Сборы в США $", revenue_column),
+    "Сборы в России": ("Сборы в России $", revenue_column),
+    "Бюджет": ("Бюджет $", budget_column),
+    "Зрители": ("Зрители", viewers_column),
+    "Рецензии 100 зрителей": ("Рецензии 100 зрителей", reviews_column),
+    "Актеры": ("Актеры", list_column),
+    "Маркетинг": ("Маркетинг", revenue_column),
+    **{key: (key, date_column) for key in DATE_KEYS},
+    "Время": ("Время в минутах", minutes_column),
+    "Топ 250": ("Топ 250", top250_column),
+    "Оценок": ("Количество оценок", votes_column),
+}
+
+# keys whose cleaner converts money and takes the production year of each value
+CONVERTED = {"Бюджет"}
+
+
+def flatten(details):
+    """Splits a sequence of details dicts into {key: (row numbers, values)} columns"""
+    columns = {}
+    for row, movie_details in enumerate(details):
+        for key, value in movie_details.items():
+            rows, values = columns.setdefault(key, ([], []))
+            rows.append(row)
+            values.append(value)
+    return columns
+
+
+def clean_column(key, values, years=None):
+    """Returns the output key and cleaned values of one flattened column.
+
+    Cleaners work value by value, so the strings go through them once per
+    distinct string and the rest (lists, numbers, None) separately. years
+    (one per value) makes a CONVERTED column use the rates of those years.
+    """
+    values = pd.Series(values, dtype=object)
+    is_str = is_instance(values, str)
+    output_key, cleaner = CLEANERS.get(key, (key, other_column))
+    if years is not None:
+        values = assign(values, is_str, clean_text(values[is_str]))
+        return output_key, cleaner(values, is_str, years).tolist()
+    result = values.copy()
+    if is_str.any():
+        texts = values[is_str]
+        result = assign(result, is_str, per_unique(
+            lambda unique: cleaner(clean_text(unique), pd.Series(True, index=unique.index)), texts))
+    if not is_str.all():
+        rest = values[~is_str]
+        result = assign(result, ~is_str, cleaner(rest, pd.Series(False, index=rest.index)))
+    return output_key, result.tolist()
+
+
+def clean_details(details, release_rates=False):
+    """Cleans a sequence of details dicts column by column; each row keeps its key order.
+
+    Budgets are converted at the latest rates, or at the rates of each
+    movie's production year with release_rates.
+    """
+    details = list(details)
+    columns = {}
+    for key, (rows, values) in flatten(details).items():
+        years = None
+        if release_rates and key in CONVERTED:
+            years = [release_year(details[row].get("Год производства")) for row in rows]
+        output_key, cleaned = clean_column(key, values, years)
+        columns[key] = (output_key, dict(zip(rows, cleaned)))
+
+    result = []
+    for row, movie_details in enumerate(details):
+        cleaned = {}
+        for key in movie_details:
+            output_key, column = columns[key]
+            cleaned[output_key] = column[row]
+        result.append(cleaned)
+    return result
+
+
+def map_chunks(function, chunks, workers=1):
+    """Yields function(chunk) for each chunk, in order.
+
+    With workers > 1 (None for one per CPU) the chunks go to that many
+    processes, at most two per worker in flight so memory stays bounded on
+    a streamed catalog. workers=1 runs everything in this process, for
+    debugging.
+    """
+    workers = workers or os.cpu_count()
+    if workers == 1:
+        for chunk in chunks:
+            yield function(chunk)
+        return
+
+    with ProcessPoolExecutor(workers) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(function, chunk))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def clean_chunks(chunks, workers=1, release_rates=False):
+    """Yields the cleaned details of each chunk of details dicts, in order, cleaned by map_chunks.
+
+    Cleaning is value by value, so the result is the same for any number
+    of workers and any chunking.
+    """
+    return map_chunks(partial(clean_details, release_rates=release_rates), chunks, workers)
@@ -0,0 +1,92 @@
+"""Offline conversion of scraped money amounts to US dollars.
+
+Rates come from the ECB history that currency_converter ships (or the file
+in CURRENCY_RATES_FILE, e.g. a newer download of eurofxref-hist.zip), so
+cleaning never waits on the network and a re-run gives the same numbers.
+The pre-euro currencies of old budgets go through their fixed euro rates.
+"""
+import os
+import re
+from datetime import date
+from functools import lru_cache
+
+from currency_converter import CurrencyConverter
+
+
+SYMBOLS = {'$': 'USD', '€': 'EUR', '₽': 'RUB', '£': 'GBP', '¥': 'JPY'}
+
+# irrevocable conversion rates of the currencies replaced by the euro, per 1 EUR
+EURO_LEGACY = {
+    'ATS': 13.7603, 'BEF': 40.3399, 'DEM': 1.95583, 'ESP': 166.386,
+    'FIM': 5.94573, 'FRF': 6.55957, 'GRD': 340.750, 'IEP': 0.787564,
+    'ITL': 1936.27, 'NLG': 2.20371, 'PTE': 200.482,
+}
+
+CURRENCY = re.compile(r'[A-Z]{3}|[$€₽£¥]')
+
+UNKNOWN_CURRENCY = "Unable to determine currency"
+
+
+@lru_cache(maxsize=None)
+def converter():
+    """The ECB rate table, read once"""
+    path = os.environ.get('CURRENCY_RATES_FILE')
+    options = {'currency_file': path} if path else {}
+    return CurrencyConverter(fallback_on_missing_rate=True, fallback_on_wrong_date=True, **options)
+
+
+@lru_cache(maxsize=1024)
+def usd_rate(currency, year=None):
+    """US dollars per unit of currency in the middle of year (the latest rate without one), None when unknown.
+
+    Years outside the ECB history use its nearest rate.
+    """
+    if currency == 'USD':
+        return 1.0
+    euros = 1.0
+    if currency in EURO_LEGACY:
+        euros, currency = 1 / EURO_LEGACY[currency], 'EUR'
+    if currency not in converter().currencies:
+        print(f"Currency {currency} has no exchange rate, keeping the amount as is.")
+        return None
+    return euros * converter().convert(1, currency, 'USD', date(year, 7, 1) if year else None)
+
+
+def parse_money(text):
+    """Splits '€ 15 000 000' into ('EUR', 15000000.0); None when it has no currency or no amount"""
+    match = CURRENCY.search(text)
+    try:
+        amount = float(re.sub(r'[^\d.,]', '', text).replace(',', '.'))
+    except ValueError:
+        return None
+    return (SYMBOLS.get(match.group(0), match.group(0)), amount) if match else None
+
+
+def convert_to_usd(text, year=None):
+    """Whole US dollars of a money string as a string, None when it cannot be converted"""
+    if not CURRENCY.search(text):
+        return UNKNOWN_CURRENCY
+    money = parse_money(text)
+    rate = usd_rate(money[0], year) if money else None
+    if rate is None:
+        return None
+    return f"{int(money[1] * rate)}"
+
+
+def convert_column(texts, years=None):
+    """Converts a column of money strings, each distinct (string, year) once"""
+    if years is None:
+        years = [None] * len(texts)
+    converted = {}
+    result = []
+    for text, year in zip(texts, years):
+        if (text, year) not in converted:
+            converted[text, year] = convert_to_usd(text, year)
+        result.append(converted[text, year])
+    return result
+
+
+def release_year(value):
+    """Production year of a 'Год производства' value such as '1994' or '2010 (3 сезона)', None otherwise"""
+    match = re.match(r'\s*(\d{4})', value) if isinstance(value, str) else None
+    return int(match.group(1)) if match else None
@@ -0,0 +1,154 @@
+"""Incremental preprocessing: only new or changed movies are cleaned and analysed.
+
+A manifest next to the dataset (optimized_data.json ->
+optimized_data.manifest.json) records, for every movie, a hash of its
+scraped record and a hash of its cleaned reviews. A run re-cleans only the
+movies whose scraped record changed, and runs the sentiment model only on
+those whose reviews changed. Every other movie is copied from the existing
+dataset, and movies missing from the input are dropped, so the result is
+always what --force, which rebuilds everything, would write.
+
+Usage: python incremental.py [--force] [../data/movies_final.json] [../data/optimized_data.json]
+"""
+import hashlib
+import json
+import os
+import sys
+import time
+
+# the API's own aggregation code computes the precomputed aggregates, so both always agree
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'api'))
+from materialize import write_aggregates
+from store import MovieStore
+
+from cleaning import clean_details
+from streaming import RecordWriter, chunked, iter_records, record_key, unique_records
+
+# bump whenever cleaning or analysis changes its output, so every movie is rebuilt
+MANIFEST_FORMAT = 1
+
+REVIEWS = "Рецензии 100 зрителей"
+ANALYSIS = "Анализ_рецензий"
+
+
+def content_hash(value):
+    return hashlib.blake2b(json.dumps(value, ensure_ascii=False).encode('utf-8'), digest_size=16).hexdigest()
+
+
+def movie_id(record):
+    return f"{record_key(record.get('title'), record.get('url')):016x}"
+
+
+def manifest_path(output_path):
+    root, _ = os.path.splitext(output_path)
+    return root + '.manifest.json'
+
+
+def read_manifest(output_path):
+    """movie id -> {'raw': hash, 'reviews': hash} of the dataset at output_path, {} when there is none"""
+    if not os.path.exists(output_path):
+        return {}
+    try:
+        with open(manifest_path(output_path), 'r', encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if manifest.get('format') != MANIFEST_FORMAT:
+        return {}
+    return manifest.get('movies') or {}
+
+
+def write_dataset(movies, output_path, manifest=None):
+    """Writes an analysed dataset, its aggregates and its manifest.
+
+    The aggregates are written before the dataset is replaced, so an API
+    watching output_path never loads a dataset without its matching
+    aggregates. The manifest is written last; without one (or after a crash)
+    the next incremental run rebuilds every movie.
+    """
+    manifest_file = manifest_path(output_path)
+    if os.path.exists(manifest_file):
+        os.remove(manifest_file)
+
+    tmp_path = output_path + '.tmp'
+    with RecordWriter(tmp_path, indent=2) as writer:
+        for movie in movies:
+            writer.write(movie)
+    write_aggregates(MovieStore.load(tmp_path), output_path)
+    os.replace(tmp_path, output_path)
+
+    if manifest is not None:
+        with open(manifest_file + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump({'format': MANIFEST_FORMAT, 'movies': manifest}, f, separators=(',', ':'))
+        os.replace(manifest_file + '.tmp', manifest_file)
+
+
+def analyse(details, reusable, counts):
+    """Replaces the cleaned reviews with their analysis; reusable is the analysis of the same reviews, if any"""
+    if REVIEWS not in details:
+        return
+    if reusable is not None:
+        details[ANALYSIS] = reusable
+        counts['reused'] += 1
+    else:
+        # the model is loaded on first use, so runs without changed reviews never load it
+        from tonality_analysis import process_reviews
+        details[ANALYSIS] = process_reviews(details[REVIEWS])
+        counts['analysed'] += 1
+    del details[REVIEWS]
+
+
+def updated_movies(input_path, existing, manifest, new_manifest, counts, chunk_size=5000):
+    """Yields the movies of input_path, fresh or from existing; the existing movies missing from it are left out"""
+    for chunk in chunked(unique_records(iter_records(input_path)), chunk_size):
+        ids = [movie_id(record) for record in chunk]
+        hashes = [content_hash(record) for record in chunk]
+        changed = [
+            i for i, (movie, raw) in enumerate(zip(ids, hashes))
+            if movie not in existing or manifest.get(movie, {}).get('raw') != raw
+        ]
+        cleaned = dict(zip(changed, clean_details([chunk[i]["details"] for i in changed])))
+
+        for i, (movie, raw, record) in enumerate(zip(ids, hashes, chunk)):
+            previous = existing.pop(movie, None)
+            if i not in cleaned:
+                new_manifest[movie] = manifest[movie]
+                counts['unchanged'] += 1
+                yield previous
+                continue
+            details = cleaned[i]
+            reviews_hash = content_hash(details[REVIEWS]) if REVIEWS in details else None
+            reusable = None
+            if previous is not None and manifest.get(movie, {}).get('reviews') == reviews_hash:
+                reusable = previous["details"].get(ANALYSIS)
+            analyse(details, reusable, counts)
+            new_manifest[movie] = {'raw': raw, 'reviews': reviews_hash}
+            counts['cleaned'] += 1
+            yield {"title": record["title"], "url": record["url"], "details": details}
+
+    counts['removed'] = len(existing)
+
+
+def update_dataset(input_path, output_path, force=False):
+    """Merges the new and changed movies of a scraped file into the analysed dataset at output_path"""
+    manifest = {} if force else read_manifest(output_path)
+    existing = {}
+    if manifest:
+        existing = {movie_id(movie): movie for movie in iter_records(output_path)}
+
+    new_manifest = {}
+    counts = dict.fromkeys(('unchanged', 'cleaned', 'reused', 'analysed', 'removed'), 0)
+    write_dataset(updated_movies(input_path, existing, manifest, new_manifest, counts), output_path, new_manifest)
+    return counts
+
+
+if __name__ == '__main__':
+    args = [arg for arg in sys.argv[1:] if arg != '--force']
+    input_path = args[0] if args else "../data/movies_final.json"
+    output_path = args[1] if len(args) > 1 else "../data/optimized_data.json"
+
+    start = time.time()
+    counts = update_dataset(input_path, output_path, force='--force' in sys.argv)
+    print(f"{output_path}: {counts['cleaned']} movies cleaned ({counts['analysed']} analysed, "
+          f"{counts['reused']} with unchanged reviews), {counts['unchanged']} unchanged, "
+          f"{counts['removed']} no longer scraped and removed, in {time.time() - start:.1f}s")
@@ -0,0 +1,333 @@
+"""Runs the preprocessing pipeline from the scraped file to the API's dataset.
+
+Stages, in order: load -> dedupe -> clean -> sentiment -> keywords ->
+optimize -> publish. Each stage writes its artifact to the work directory
+(data/pipeline/ by default) and records a fingerprint of its inputs in
+pipeline.json there. A later run skips every stage whose fingerprint did
+not change, so a crashed run resumes where it stopped. The publish stage
+also records a hash of the files it published and runs again when they
+were deleted or changed since. --from STAGE reruns from that stage on
+with the cached artifacts before it, and --to STAGE stops after it. Every
+stage reports its wall time, throughput and the peak memory of this
+process (cleaning workers not included).
+
+Paths default to the repository layout, so the runner works from any
+directory.
+
+Usage: python pipeline.py [--input FILE] [--from STAGE] [--to STAGE] [--force] [--workers N]
+"""
+import argparse
+import hashlib
+import json
+import os
+import resource
+import shutil
+import sys
+import time
+from itertools import zip_longest
+
+from incremental import ANALYSIS, REVIEWS, manifest_path, write_dataset
+from main import clean_file_streaming
+from materialize import aggregates_path
+from streaming import RecordWriter, iter_records, movie_record, unique_records
+
+ROOT = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+# bump whenever a stage changes its artifact, so cached artifacts are rebuilt
+PIPELINE_FORMAT = 1
+
+DATASET = 'optimized_data.json'
+
+
+def review_count(record):
+    return len((record.get("details") or {}).get(REVIEWS) or [])
+
+
+def in_step(movies, *entries):
+    """Zips the cleaned movies with the per-movie entries of later stages, checking they are the same movies"""
+    for movie, *rest in zip_longest(movies, *entries, fillvalue={}):
+        key = movie_record(movie)[0]
+        for entry in rest:
+            if movie_record(entry)[0] != key:
+                raise ValueError(f"stage artifacts are out of step at {movie.get('title')!r}; rerun with --force")
+        yield (movie, *rest)
+
+
+class Run:
+    """Paths and options of one pipeline run"""
+
+    def __init__(self, args):
+        self.input = os.path.abspath(args.input)
+        self.work_dir = os.path.abspath(args.work_dir)
+        self.publish_dir = os.path.abspath(args.publish_dir)
+        self.workers = args.workers
+        self.release_rates = args.release_rates
+
+    def artifact(self, stage):
+        return os.path.join(self.work_dir, DATASET if stage == 'optimize' else f'{stage}.ndjson')
+
+
+# Stages. Each reads the artifacts of the stages before it, writes its own
+# and returns (records, reviews) it processed; reviews is None when a stage
+# does not look at them.
+
+def load(run):
+    """Copies the scraped JSON or NDJSON file to NDJSON"""
+    reviews = 0
+    with RecordWriter(run.artifact('load')) as writer:
+        for item in iter_records(run.input):
+            reviews += review_count(item)
+            writer.write(item)
+    return writer.count, reviews
+
+
+def dedupe(run):
+    """Keeps the first record of every (title, url)"""
+    reviews = 0
+    with RecordWriter(run.artifact('dedupe')) as writer:
+        for record in unique_records(iter_records(run.artifact('load'))):
+            reviews += review_count(record)
+            writer.write(record)
+    return writer.count, reviews
+
+
+def clean(run):
+    return clean_file_streaming(run.artifact('dedupe'), run.artifact('clean'), release_rates=run.release_rates,
+                                workers=run.workers), None
+
+
+def sentiment(run):
+    """Scores the long enough reviews of every movie with the sentiment model"""
+    from tonality_analysis import enhanced_analyze_sentiment, review_texts
+
+    reviews = 0
+    with RecordWriter(run.artifact('sentiment')) as writer:
+        for movie in iter_records(run.artifact('clean')):
+            entry = {"title": movie["title"], "url": movie["url"]}
+            if REVIEWS in movie["details"]:
+                texts = review_texts(movie["details"][REVIEWS])
+                entry["sentiments"] = [float(s) for s in enhanced_analyze_sentiment(texts)]
+                reviews += len(texts)
+            writer.write(entry)
+    return writer.count, reviews
+
+
+def keywords(run):
+    """Extracts the TF-IDF keywords of every movie's reviews"""
+    from tonality_analysis import extract_keywords, review_texts
+
+    reviews = 0
+    with RecordWriter(run.artifact('keywords')) as writer:
+        for movie in iter_records(run.artifact('clean')):
+            entry = {"title": movie["title"], "url": movie["url"]}
+            if REVIEWS in movie["details"]:
+                texts = review_texts(movie["details"][REVIEWS])
+                entry["keywords"] = extract_keywords(texts)
+                reviews += len(texts)
+            writer.write(entry)
+    return writer.count, reviews
+
+
+def optimize(run):
+    """Replaces the reviews of every cleaned movie with their analysis and writes the dataset and its aggregates"""
+    from tonality_analysis import review_analysis, review_texts
+
+    counts = {'records': 0, 'reviews': 0}
+
+    def movies():
+        for movie, scores, words in in_step(iter_records(run.artifact('clean')),
+                                            iter_records(run.artifact('sentiment')),
+                                            iter_records(run.artifact('keywords'))):
+            if REVIEWS in movie["details"]:
+                texts = review_texts(movie["details"][REVIEWS])
+                movie["details"][ANALYSIS] = review_analysis(texts, scores["sentiments"], words["keywords"])
+                del movie["details"][REVIEWS]
+                counts['reviews'] += len(texts)
+            counts['records'] += 1
+            yield movie
+
+    write_dataset(movies(), run.artifact('optimize'))
+    return counts['records'], counts['reviews']
+
+
+def published(run):
+    """The files the publish stage writes, in the order it writes them"""
+    target = os.path.join(run.publish_dir, DATASET)
+    return [aggregates_path(target), target]
+
+
+def publish(run):
+    """Copies the dataset and its aggregates into the API's data directory, aggregates first"""
+    source = run.artifact('optimize')
+    target = os.path.join(run.publish_dir, DATASET)
+    # the published dataset is not maintained by incremental.py any more
+    if os.path.exists(manifest_path(target)):
+        os.remove(manifest_path(target))
+    for src, dst in ((aggregates_path(source), aggregates_path(target)), (source, target)):
+        shutil.copyfile(src, dst + '.tmp')
+        os.replace(dst + '.tmp', dst)
+    return sum(1 for _ in iter_records(target)), None
+
+
+STAGES = [
+    ('load', load),
+    ('dedupe', dedupe),
+    ('clean', clean),
+    ('sentiment', sentiment),
+    ('keywords', keywords),
+    ('optimize', optimize),
+    ('publish', publish),
+]
+STAGE_NAMES = [name for name, _ in STAGES]
+
+
+def fingerprint(run, stage, upstream):
+    """Hash of everything a stage's artifact depends on: the stage before it and the options it uses"""
+    parts = [PIPELINE_FORMAT, stage, upstream]
+    if stage == 'load':
+        info = os.stat(run.input)
+        parts += [run.input, info.st_size, info.st_mtime_ns]
+    elif stage == 'clean':
+        parts.append(run.release_rates)
+    elif stage == 'publish':
+        parts.append(run.publish_dir)
+    return hashlib.sha1(json.dumps(parts).encode('utf-8')).hexdigest()[:16]
+
+
+def file_digest(paths):
+    """Hash of the contents of the given files, None when one of them is missing"""
+    digest = hashlib.sha1()
+    for path in paths:
+        try:
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    digest.update(chunk)
+        except FileNotFoundError:
+            return None
+    return digest.hexdigest()[:16]
+
+
+def outputs_intact(run, stage, cached):
+    """Whether the files a cached stage wrote are still there; the published ones must also be unchanged"""
+    if stage == 'publish':
+        digest = file_digest(published(run))
+        return digest is not None and cached.get('published') == digest
+    return os.path.exists(run.artifact(stage))
+
+
+def reset_peak_memory():
+    """Starts a new peak RSS measurement where Linux allows it; otherwise the peak is the process's so far"""
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+    except OSError:
+        pass
+
+
+def peak_memory_mb():
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def read_state(work_dir):
+    try:
+        with open(os.path.join(work_dir, 'pipeline.json'), encoding='utf-8') as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return state.get('stages', {}) if state.get('format') == PIPELINE_FORMAT else {}
+
+
+def write_state(work_dir, stages):
+    path = os.path.join(work_dir, 'pipeline.json')
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump({'format': PIPELINE_FORMAT, 'stages': stages}, f, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def run_pipeline(run, start=None, stop=None, force=False):
+    """Runs the stages from start (or the first whose cache is stale) to stop; returns one report row per stage"""
+    os.makedirs(run.work_dir, exist_ok=True)
+    state = {} if force else read_state(run.work_dir)
+    first = STAGE_NAMES.index(start) if start else 0
+    last = STAGE_NAMES.index(stop) if stop else len(STAGES) - 1
+
+    report = []
+    upstream = None
+    for position, (name, stage) in enumerate(STAGES[:last + 1]):
+        key = fingerprint(run, name, upstream)
+        cached = state.get(name)
+        fresh = cached is not None and cached['fingerprint'] == key and outputs_intact(run, name, cached)
+        if position < first and not fresh:
+            raise SystemExit(f"cannot start at {start}: the {name} artifact is missing or stale, run it first")
+        # stages before --from are reused; without --from every fresh stage is
+        if fresh and (position < first or start is None):
+            report.append(dict(cached, stage=name, status='cached'))
+        else:
+            reset_peak_memory()
+            began = time.time()
+            records, reviews = stage(run)
+            cached = {
+                'fingerprint': key,
+                'records': records,
+                'reviews': reviews,
+                'seconds': round(time.time() - began, 3),
+                'peak_mb': round(peak_memory_mb(), 1),
+            }
+            if name == 'publish':
+                cached['published'] = file_digest(published(run))
+            state[name] = cached
+            # a rerun stage invalidates the cached stages after it
+            for later in STAGE_NAMES[position + 1:]:
+                state.pop(later, None)
+            write_state(run.work_dir, state)
+            report.append(dict(cached, stage=name, status='ran'))
+        upstream = key
+    return report
+
+
+def print_report(report):
+    def rate(count, seconds):
+        return '-' if count is None else f"{count / seconds:,.0f}" if seconds else 'inf'
+
+    print(f"{'stage':<10} {'status':<7} {'wall s':>8} {'records':>9} {'records/s':>10} "
+          f"{'reviews':>9} {'reviews/s':>10} {'peak MB':>8}")
+    for row in report:
+        reviews = '-' if row['reviews'] is None else row['reviews']
+        print(f"{row['stage']:<10} {row['status']:<7} {row['seconds']:>8.2f} {row['records']:>9} "
+              f"{rate(row['records'], row['seconds']):>10} {reviews:>9} {rate(row['reviews'], row['seconds']):>10} "
+              f"{row['peak_mb']:>8.1f}")
+    ran = [row for row in report if row['status'] == 'ran']
+    print(f"total {sum(row['seconds'] for row in ran):.2f}s in {len(ran)} stages run, {len(report) - len(ran)} cached")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run the preprocessing pipeline')
+    parser.add_argument('--input', default=os.path.join(ROOT, 'data', 'movies_final.json'),
+                        help='scraped JSON or NDJSON file')
+    parser.add_argument('--work-dir', default=os.path.join(ROOT, 'data', 'pipeline'),
+                        help='where the stage artifacts are cached')
+    parser.add_argument('--publish-dir', default=os.path.join(ROOT, 'api', 'data'),
+                        help='the API data directory the dataset is published to')
+    parser.add_argument('--from', dest='start', choices=STAGE_NAMES, help='rerun from this stage on')
+    parser.add_argument('--to', dest='stop', choices=STAGE_NAMES, help='stop after this stage')
+    parser.add_argument('--force', action='store_true', help='ignore every cached artifact')
+    parser.add_argument('--workers', type=int, default=None, help='cleaning processes, 1 for serial (default: CPUs)')
+    parser.add_argument('--release-rates', action='store_true',
+                        help="convert budgets at the rates of each movie's production year")
+    args = parser.parse_args()
+    if args.start and args.stop and STAGE_NAMES.index(args.start) > STAGE_NAMES.index(args.stop):
+        parser.error('--from comes after --to')
+
+    print_report(run_pipeline(Run(args), args.start, args.stop, args.force))
+
+
+if __name__ == '__main__':
+    main()
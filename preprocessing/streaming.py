@@ -0,0 +1,169 @@
+"""Record-at-a-time reading and writing of movie files.
+
+Catalogs are read and written one movie at a time, so preprocessing holds
+a chunk of movies in memory rather than the whole scraped file. Files
+ending in .ndjson or .jsonl hold one JSON record per line. Other files
+hold one JSON array; it is read incrementally and written exactly as
+json.dump would write it.
+"""
+import hashlib
+import json
+import re
+from itertools import islice
+
+
+NDJSON_SUFFIXES = ('.ndjson', '.jsonl')
+
+SEPARATORS = re.compile(r'[\s,]*')
+
+
+def is_ndjson(path):
+    return path.endswith(NDJSON_SUFFIXES)
+
+
+def iter_json_array(f, chunk_size=1 << 20):
+    """Yields the items of a JSON array one at a time, reading chunk_size characters at once.
+
+    A file holding a single object yields that object, as load_and_process_data does.
+    """
+    decoder = json.JSONDecoder()
+    buffer = ''
+    while not buffer:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        buffer = chunk.lstrip()
+    if not buffer.startswith('['):
+        yield json.loads(buffer + f.read())
+        return
+
+    pos = 1
+    while True:
+        pos = SEPARATORS.match(buffer, pos).end()
+        if pos < len(buffer) and buffer[pos] == ']':
+            return
+        try:
+            item, end = decoder.raw_decode(buffer, pos)
+            complete = end < len(buffer)
+        except json.JSONDecodeError:
+            complete = False
+        if not complete:
+            # read at least as much as is pending, so an item larger than
+            # chunk_size is decoded O(log size) times rather than O(size)
+            more = f.read(max(chunk_size, len(buffer) - pos))
+            if more:
+                buffer, pos = buffer[pos:] + more, 0
+                continue
+            # at the end of the file: a truncated item raises here
+            item, end = decoder.raw_decode(buffer, pos)
+        yield item
+        pos = end
+
+
+def iter_items(path):
+    """Yields the items of a JSON array file decoded, or the lines of an NDJSON file as they are.
+
+    Undecoded lines are cheap to hand to worker processes, which decode
+    them with decode_item.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        if is_ndjson(path):
+            for line in f:
+                if line.strip():
+                    yield line
+        else:
+            yield from iter_json_array(f)
+
+
+def decode_item(item):
+    return json.loads(item) if isinstance(item, str) else item
+
+
+def iter_records(path):
+    """Yields the records of a JSON array or NDJSON file one at a time"""
+    for item in iter_items(path):
+        yield decode_item(item)
+
+
+def record_key(title, url):
+    """64-bit hash of (title, url), so the set of seen movies stays small"""
+    digest = hashlib.blake2b(json.dumps([title, url], ensure_ascii=False).encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+def movie_record(item):
+    """(record_key, record) of a scraped item, with the fields load_and_process_data keeps"""
+    title = item.get("title")
+    url = item.get("url")
+    return record_key(title, url), {"title": title, "url": url, "details": item.get("details", {})}
+
+
+def unique_records(items):
+    """Keeps the first record of every (title, url)"""
+    seen = set()
+    for item in items:
+        key, record = movie_record(item)
+        if key not in seen:
+            seen.add(key)
+            yield record
+
+
+def chunked(items, size):
+    """Yields lists of up to size items"""
+    items = iter(items)
+    while True:
+        chunk = list(islice(items, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def encode_record(record, indent=None, ndjson=False):
+    """The text RecordWriter writes for a record, before its separator"""
+    if ndjson or indent is None:
+        return json.dumps(record, ensure_ascii=False)
+    prefix = ' ' * indent
+    return '\n'.join(prefix + line for line in json.dumps(record, indent=indent, ensure_ascii=False).split('\n'))
+
+
+class RecordWriter:
+    """Writes records to a JSON array or NDJSON file as they come.
+
+    The JSON array is byte for byte what json.dump(records, f, indent=indent,
+    ensure_ascii=False) writes. Records already encoded with encode_record
+    (e.g. in a worker process) go through write_encoded.
+    """
+
+    def __init__(self, path, indent=None):
+        self.f = open(path, 'w', encoding='utf-8')
+        self.ndjson = is_ndjson(path)
+        self.indent = indent
+        self.count = 0
+
+    def write(self, record):
+        self.write_encoded(encode_record(record, self.indent, self.ndjson))
+
+    def write_encoded(self, text):
+        if self.ndjson:
+            self.f.write(text + '\n')
+        elif self.indent is None:
+            self.f.write((', ' if self.count else '[') + text)
+        else:
+            self.f.write((',\n' if self.count else '[\n') + text)
+        self.count += 1
+
+    def close(self):
+        if not self.ndjson:
+            if not self.count:
+                self.f.write('[]')
+            elif self.indent is None:
+                self.f.write(']')
+            else:
+                self.f.write('\n]')
+        self.f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,6 +1,6 @@
-import json
 import re
 from collections import Counter
+from functools import lru_cache
 from pymorphy3 import MorphAnalyzer
 from transformers import pipeline
 from sklearn.feature_extraction.text import TfidfVectorizer
@@ -9,6 +9,9 @@ import numpy as np
 from transformers import AutoModelForSequenceClassification, AutoTokenizer
 import torch
 
+from incremental import write_dataset
+from streaming import iter_records
+
 morph = MorphAnalyzer()
 
 stopwords = {"фильм", "очень", "это", "который", "весь", "быть", "этот"}
@@ -28,8 +31,11 @@ def extract_keywords(texts, top_n=15):
     return vectorizer.get_feature_names_out().tolist()
 
 model_name = "blanchefort/rubert-base-cased-sentiment"
-tokenizer = AutoTokenizer.from_pretrained(model_name)
-model = AutoModelForSequenceClassification.from_pretrained(model_name)
+
+@lru_cache(maxsize=None)
+def sentiment_model():
+    """Loads the tokenizer and model on first use, so keyword-only work never loads them"""
+    return AutoTokenizer.from_pretrained(model_name), AutoModelForSequenceClassification.from_pretrained(model_name)
 
 weights = {
         'POSITIVE': {
@@ -60,6 +66,7 @@ def get_emotion_weight(label, score):
 def enhanced_analyze_sentiment(texts):
 
     sentiment_scores = []
+    tokenizer, model = sentiment_model()
     
     for text in texts:
         try:
@@ -177,30 +184,37 @@ FILM_TYPE_DESCRIPTIONS = {
     "negative_outliers": "Few extremely negative reviews drag down average"
 }
 
-def process_reviews(reviews):
+def review_texts(reviews):
+    """The reviews long enough to analyse"""
+    return [reviews[i] for i in range(len(reviews)) if len(reviews[i]) > 100]
 
-    texts = [reviews[i] for i in range(len(reviews)) if len(reviews[i]) > 100]
-    sentiments = enhanced_analyze_sentiment(texts)
+def review_analysis(texts, sentiments, keywords):
     return {
-        "keywords": extract_keywords(texts),
+        "keywords": keywords,
         "softmax": softmax_aggregate(sentiments),
         **complex_estimation(sentiments),
         "total_reviews": len(texts),
         "sentiments": sentiments
     }
 
+def process_reviews(reviews):
+
+    texts = review_texts(reviews)
+    sentiments = enhanced_analyze_sentiment(texts)
+    return review_analysis(texts, sentiments, extract_keywords(texts))
+
 def optimize_file(input_path, output_path):
-    with open(input_path, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    
-    for movie in tqdm(data, desc="Film data processing"):
-        if "Рецензии 100 зрителей" in movie["details"]:
-            analysis = process_reviews(movie["details"]["Рецензии 100 зрителей"])
-            movie["details"]["Анализ_рецензий"] = analysis
-            del movie["details"]["Рецензии 100 зрителей"]
-    
-    with open(output_path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    """Analyses the reviews of a cleaned JSON or NDJSON file one movie at a time, writing each as it finishes"""
+    def analysed_movies():
+        for movie in tqdm(iter_records(input_path), desc="Film data processing"):
+            if "Рецензии 100 зрителей" in movie["details"]:
+                analysis = process_reviews(movie["details"]["Рецензии 100 зрителей"])
+                movie["details"]["Анализ_рецензий"] = analysis
+                del movie["details"]["Рецензии 100 зрителей"]
+            yield movie
+
+    # no manifest: the next incremental run rebuilds every movie of this dataset
+    write_dataset(analysed_movies(), output_path)
 
 
 if __name__ == '__main__':